@@ -1,5 +1,7 @@
 from .digicord import Digicord
 
-def setup(bot):
-    bot.add_cog(Digicord(bot))
-
+async def setup(bot):
+    cog = Digicord(bot)
+    # Listeners only go live once the settings they use are loaded
+    await cog.initialize()
+    bot.add_cog(cog)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Message Rate Class"""
+import math
+import time
+
+
+# Seconds over which messages are averaged
+TIME_CONSTANT = 3600.0
+
+
+
+class MessageRate:
+    """Exponentially weighted moving average of a guild's message rate.
+    Each message decays the running count by the time since the last one
+    and adds one, so an update costs the same regardless of traffic.
+    The count is divided by the decayed length of time observed so far,
+    so a fresh average is not mistaken for a quiet guild.
+    """
+    __slots__ = ("count", "updated", "started")
+
+    def __init__(self, count:float=0.0, updated:float=None,
+            started:float=None):
+        """
+        Parameters
+        ----------
+        count: float
+            Decayed number of messages, roughly those of the last hour.
+        updated: float
+            Unix time the count was last decayed. The default is now.
+        started: float
+            Unix time counting started. The default is updated.
+        """
+        self.count = count
+        self.updated = time.time() if updated is None else updated
+        self.started = self.updated if started is None else started
+
+
+    def observe(self, now:float=None) -> float:
+        """Counts one message.
+
+        Parameters
+        ----------
+        now: float
+            Unix time of the message. The default is now.
+
+        Returns
+        -------
+        float:
+            Messages per hour including this one.
+        """
+        now = time.time() if now is None else now
+        self.count = self._decayed(now) + 1
+        self.updated = now
+        return self.per_hour(now)
+
+
+    def per_hour(self, now:float=None) -> float:
+        """Returns the messages per hour without counting a message.
+
+        Parameters
+        ----------
+        now: float
+            The time to decay the count to. The default is now.
+        """
+        now = time.time() if now is None else now
+        return self._decayed(now) * 3600 / self._window(now)
+
+
+    def _decayed(self, now:float) -> float:
+        elapsed = max(0.0, now - self.updated)
+        return self.count * math.exp(-elapsed / TIME_CONSTANT)
+
+
+    def _window(self, now:float) -> float:
+        """Seconds the count stands for, approaching TIME_CONSTANT."""
+        age = max(1.0, now - self.started)
+        return TIME_CONSTANT * -math.expm1(-age / TIME_CONSTANT)
+
+
+    def to_dict(self) -> dict:
+        """Returns all parameters needed to recreate this object
+
+        Returns
+        -------
+        dict:
+            Parameters needed to recreate this object
+        """
+        return {"count": self.count, "updated": self.updated,
+                "started": self.started}
+
+
+    @staticmethod
+    def from_dict(parameters:dict):
+        """Creates an instance of this object with the given dictionary"""
+        return MessageRate(
+            count=parameters["count"],
+            updated=parameters["updated"],
+            started=parameters["started"]
+        )
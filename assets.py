@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Asset Manifest Class"""
+import hashlib
+import json
+import logging
+import os
+
+
+LOG = logging.getLogger("red.digicord")
+
+
+# Determine image folder locations
+FILE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(FILE_DIR, "images")
+SPRITES_DIR = os.path.join(IMAGES_DIR, "sprites")
+FIELD_DIR = os.path.join(IMAGES_DIR, "field")
+MANIFEST_FILE = os.path.join(IMAGES_DIR, "manifest.json")
+MANIFEST_VERSION = 1
+
+
+def sprite_path(species_number:int) -> str:
+    """Returns the file path for the sprite given a Digimon number.
+    Parameters
+    ----------
+    species_number: int
+        The number to get the sprite image for.
+    Returns
+    -------
+    str:
+        The file path for the sprite image.
+    """
+    return os.path.join(SPRITES_DIR, f"sprite-{species_number:03d}.png")
+
+
+def field_path(species_number:int) -> str:
+    """Returns the file path for the field image given a Digimon number.
+    Parameters
+    ----------
+    species_number: int
+        The number to get the field image for.
+    Returns
+    -------
+    str:
+        The file path for the field image.
+    """
+    return os.path.join(FIELD_DIR, f"field-{species_number:03d}.png")
+
+
+
+class AssetManifest:
+    def __init__(self, file_path:str=MANIFEST_FILE):
+        """Reads the manifest written by util/images.py.
+        A missing or outdated manifest is not an error, the images are then
+        only checked for existence.
+
+        Parameters
+        ----------
+        file_path: str
+            Location of the manifest file.
+        """
+        self._records = dict()
+        try:
+            with open(file_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            LOG.warning(f"No asset manifest at {file_path}")
+            return
+        if manifest.get("version") != MANIFEST_VERSION:
+            LOG.warning(f"Ignoring asset manifest version "\
+                    f"{manifest.get('version')}")
+            return
+        for species_number, kinds in manifest["species"].items():
+            self._records[int(species_number)] = kinds
+
+
+    def expected_files(self, species_number:int) -> list:
+        """Returns the image files a species needs.
+
+        Parameters
+        ----------
+        species_number: int
+            The species to get the files of.
+
+        Returns
+        -------
+        list:
+            (path, size, sha256) tuples, size and sha256 are None when the
+            manifest has no record of the file.
+        """
+        records = self._records.get(species_number, {})
+        files = []
+        for kind, path in (("sprite", sprite_path(species_number)),
+                ("field", field_path(species_number))):
+            record = records.get(kind)
+            if record is None:
+                files.append((path, None, None))
+            else:
+                files.append((path, record["size"], record["sha256"]))
+        return files
+
+
+    def check_presence(self, species_numbers:list) -> set:
+        """Finds species with missing or truncated images using stat only.
+
+        Parameters
+        ----------
+        species_numbers: list
+            The species to check.
+
+        Returns
+        -------
+        set:
+            The species numbers with a broken image.
+        """
+        broken = set()
+        for species_number in species_numbers:
+            for path, size, _ in self.expected_files(species_number):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    LOG.warning(f"Missing image {path}")
+                    broken.add(species_number)
+                    break
+                if size is not None and st.st_size != size:
+                    LOG.warning(f"Image {path} is {st.st_size} bytes, "\
+                            f"expected {size}")
+                    broken.add(species_number)
+                    break
+        return broken
+
+
+    def verify_hashes(self, species_numbers:list) -> set:
+        """Finds species whose images do not match the manifest hashes.
+        This reads every image, so it is meant to be run off the event loop.
+
+        Parameters
+        ----------
+        species_numbers: list
+            The species to check.
+
+        Returns
+        -------
+        set:
+            The species numbers with a broken image.
+        """
+        broken = set()
+        for species_number in species_numbers:
+            for path, _, sha256 in self.expected_files(species_number):
+                if sha256 is None:
+                    continue
+                digest = hashlib.sha256()
+                try:
+                    with open(path, "rb") as f:
+                        for chunk in iter(lambda: f.read(64 * 1024), b""):
+                            digest.update(chunk)
+                except OSError:
+                    LOG.warning(f"Missing image {path}")
+                    broken.add(species_number)
+                    break
+                if digest.hexdigest() != sha256:
+                    LOG.warning(f"Image {path} does not match its hash")
+                    broken.add(species_number)
+                    break
+        return broken
+
+
+    def sprite_version(self) -> str:
+        """Returns a digest of the sprite hashes in the manifest, which
+        changes whenever a sprite is refreshed.
+
+        Returns
+        -------
+        str:
+            Twelve hex digits, the same for every manifest without sprites.
+        """
+        digest = hashlib.sha256()
+        for species_number in sorted(self._records):
+            record = self._records[species_number].get("sprite")
+            if record is not None:
+                digest.update(f"{species_number}:{record['sha256']};"\
+                        .encode())
+        return digest.hexdigest()[:12]
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Cache Classes"""
+import asyncio
+import collections
+import logging
+import time
+
+
+LOG = logging.getLogger("red.digicord")
+
+# Evicted keys remembered at least, to tell reloads from first loads
+_EVICTED_KEPT = 1024
+
+
+
+class BoundedCache:
+    """Holds at most a number of values, dropping the least recently used
+    when full, and optionally forgets values after a fixed time.
+    Values marked dirty are handed to a write back coroutine when they are
+    dropped, so state kept only in memory for a while is not lost.
+    """
+    def __init__(self, max_size:int, ttl:float=None, write_back=None):
+        """
+        Parameters
+        ----------
+        max_size: int
+            Values kept at most.
+        ttl: float
+            Seconds a value is kept. The default is None, which keeps
+            values until they are evicted.
+        write_back: coroutine function
+            Called with the key and value of a dirty value that is dropped
+            or flushed. The default is None, for values that are never
+            marked dirty.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._write_back = write_back
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+        # key -> (expiry or None, value), least recently used first
+        self._entries = collections.OrderedDict()
+        self._dirty = set()
+        # Keys evicted lately, so a miss on one counts as a reload
+        self._evicted = collections.OrderedDict()
+        # key -> value dropped while dirty and still being written back
+        self._writing = dict()
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def get(self, key, default=None):
+        """Returns a live value, making it the most recently used.
+
+        Parameters
+        ----------
+        key: hashable
+            The key the value was put under.
+        default: object
+            Returned if there is no live value. The default is None.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] is None or entry[0] >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._drop(key)
+        # Still being written back, so it is the latest value
+        value = self._writing.get(key)
+        if value is not None:
+            self.put(key, value)
+            self.hits += 1
+            return value
+        self.misses += 1
+        if self._evicted.pop(key, None) is not None:
+            self.reloads += 1
+        return default
+
+
+    def put(self, key, value, dirty:bool=False) -> None:
+        """Stores a value, evicting the least recently used one if full.
+
+        Parameters
+        ----------
+        key: hashable
+            The key to store the value under.
+        value: object
+            The value.
+        dirty: bool
+            Whether the value has to be written back when it is dropped.
+            The default is False.
+        """
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (expiry, value)
+        self._entries.move_to_end(key)
+        if dirty:
+            self._dirty.add(key)
+        while len(self._entries) > self.max_size:
+            self._evict(next(iter(self._entries)))
+
+
+    def mark_dirty(self, key) -> None:
+        """Marks a value changed in place as needing a write back.
+
+        Parameters
+        ----------
+        key: hashable
+            The key the value was put under.
+        """
+        if key in self._entries:
+            self._dirty.add(key)
+
+
+    def pop(self, key, default=None):
+        """Removes and returns a live value without writing it back.
+
+        Parameters
+        ----------
+        key: hashable
+            The key the value was put under.
+        default: object
+            Returned if there is no live value. The default is None.
+        """
+        value = self.get(key, self)
+        if value is self:
+            return default
+        self.invalidate(key)
+        return value
+
+
+    def invalidate(self, key) -> None:
+        """Forgets a value without writing it back.
+
+        Parameters
+        ----------
+        key: hashable
+            The key the value was put under.
+        """
+        self._entries.pop(key, None)
+        self._dirty.discard(key)
+
+
+    def clear(self) -> None:
+        """Forgets every value without writing any back."""
+        self._entries.clear()
+        self._dirty.clear()
+
+
+    def items(self) -> list:
+        """Returns the key and value pairs, least recently used first."""
+        return [(key, entry[1]) for key, entry in self._entries.items()]
+
+
+    def resize(self, max_size:int) -> None:
+        """Changes the number of values kept, evicting the excess.
+
+        Parameters
+        ----------
+        max_size: int
+            Values kept at most.
+        """
+        self.max_size = max_size
+        while len(self._entries) > self.max_size:
+            self._evict(next(iter(self._entries)))
+
+
+    async def flush(self) -> None:
+        """Writes back every dirty value, keeping them cached."""
+        for key in list(self._dirty):
+            entry = self._entries.get(key)
+            self._dirty.discard(key)
+            if entry is not None:
+                await self._write_back(key, entry[1])
+
+
+    def _evict(self, key) -> None:
+        """Drops a value to make room, remembering that it was evicted."""
+        self._drop(key)
+        self.evictions += 1
+        self._evicted[key] = True
+        while len(self._evicted) > max(self.max_size, _EVICTED_KEPT):
+            self._evicted.popitem(last=False)
+
+
+    def _drop(self, key) -> None:
+        """Forgets a value, writing it back in the background if dirty."""
+        _, value = self._entries.pop(key)
+        if key in self._dirty:
+            self._dirty.discard(key)
+            self._writing[key] = value
+            asyncio.ensure_future(self._write_back_dropped(key, value))
+
+
+    async def _write_back_dropped(self, key, value) -> None:
+        try:
+            await self._write_back(key, value)
+        except Exception:
+            LOG.exception(f"Could not write back evicted {key}")
+        finally:
+            if self._writing.get(key) is value:
+                del self._writing[key]
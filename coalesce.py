@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Write Coalescer Class"""
+import asyncio
+
+
+
+class WriteCoalescer:
+    """Merges the changes queued for a key into one read and one write.
+    A change queued while an earlier batch of its key is being read or
+    written waits for that batch, together with every other change queued
+    meanwhile, so a burst costs two storage operations however long it is.
+    Changes are applied in the order they were queued.
+    """
+    def __init__(self, read, write, delay:float=0.0):
+        """
+        Parameters
+        ----------
+        read: coroutine function
+            Called with a key, returns its state. The state must be a copy
+            the changes may modify.
+        write: coroutine function
+            Called with a key and its changed state.
+        delay: float
+            Seconds a batch waits for more changes before it is read.
+            The default is 0, so a lone change is not slowed down.
+        """
+        self._read = read
+        self._write = write
+        self.delay = delay
+        self.operations = 0
+        self.writes = 0
+        # key -> [(change, future)] not yet read
+        self._pending = dict()
+        # key -> task reading and writing its latest batch
+        self._flushing = dict()
+
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+    async def submit(self, key, change):
+        """Queues a change and waits until it is written.
+
+        Parameters
+        ----------
+        key: hashable
+            What the change applies to, such as a user id.
+        change: function
+            Called with the key's state, which it modifies in place.
+            It must leave the state unchanged if it raises.
+
+        Returns
+        -------
+        object:
+            What the change returned.
+
+        Raises
+        ------
+        Exception
+            Whatever the change raised, or the read or write failed with.
+        """
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            previous = self._flushing.get(key)
+            self._flushing[key] = asyncio.ensure_future(
+                    self._flush(key, previous))
+        batch.append((change, future))
+        self.operations += 1
+        return await future
+
+
+    async def _flush(self, key, previous:asyncio.Task) -> None:
+        """Applies and writes a key's batch once its previous one is done.
+        Parameters
+        ----------
+        key: hashable
+            The key to write.
+        previous: asyncio.Task
+            The flush of the key's previous batch, may be None.
+        """
+        try:
+            if previous is not None:
+                await asyncio.wait((previous,))
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            batch = self._pending.pop(key)
+            try:
+                state = await self._read(key)
+            except Exception as exp:
+                for _, future in batch:
+                    _settle(future, exception=exp)
+                return
+            results = []
+            for change, future in batch:
+                try:
+                    results.append((future, change(state), None))
+                except Exception as exp:
+                    results.append((future, None, exp))
+            if any(exp is None for _, _, exp in results):
+                try:
+                    await self._write(key, state)
+                    self.writes += 1
+                except Exception as exp:
+                    results = [(future, None, error or exp)
+                            for future, _, error in results]
+            for future, result, exp in results:
+                _settle(future, result, exp)
+        finally:
+            if self._flushing.get(key) is asyncio.current_task():
+                del self._flushing[key]
+
+
+
+def _settle(future:asyncio.Future, result=None, exception:Exception=None)\
+        -> None:
+    """Completes a future unless its waiter gave up on it."""
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Collection Filter Class"""
+import operator
+import re
+
+from .database import Database
+from .digimon import Stage
+
+
+_COMPARISONS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    "=": operator.eq,
+    ">=": operator.ge,
+    ">": operator.gt,
+}
+_TERM = re.compile(r"^(level|species|stage)(<=|>=|<|>|=)(.+)$")
+
+
+
+class InvalidFilter(Exception):
+    def __init__(self, term:str, reason:str):
+        self.term = term
+        self.reason = reason
+
+    def __str__(self):
+        return f"Invalid filter {self.term}: {self.reason}"
+
+
+
+class CollectionFilter:
+    """Selects Digimon of a collection by level, species, stage and
+    duplication. Every term has to match.
+    """
+    def __init__(self, database:Database, terms:list):
+        """
+        Parameters
+        ----------
+        database: Database
+            The known species, used to resolve species names.
+        terms: list
+            Terms such as level<10, species=5, species=Agumon,
+            stage=Rookie or duplicates. duplicates matches every Digimon
+            but the highest level one of each species.
+
+        Raises
+        ------
+        InvalidFilter
+            A term can not be understood.
+        """
+        if not terms:
+            raise InvalidFilter("", "at least one term is needed")
+        self.duplicates = False
+        self._levels = []
+        self._species = None
+        self._stage = None
+        for term in terms:
+            term = term.lower()
+            if term == "duplicates":
+                self.duplicates = True
+                continue
+            match = _TERM.match(term)
+            if match is None:
+                raise InvalidFilter(term, "expected level, species, stage "\
+                        "or duplicates")
+            key, op, value = match.groups()
+            if key == "level":
+                try:
+                    self._levels.append((_COMPARISONS[op], int(value)))
+                except ValueError:
+                    raise InvalidFilter(term, "level has to be a number")
+                continue
+            if op != "=":
+                raise InvalidFilter(term, f"{key} can only be compared "\
+                        "with =")
+            if key == "species":
+                self._species = _species_number(database, term, value)
+            else:
+                try:
+                    self._stage = Stage.from_string(value).value
+                except KeyError:
+                    raise InvalidFilter(term, "no such stage")
+        self._database = database
+
+
+    def _matches(self, digimon:dict) -> bool:
+        if self._species is not None \
+                and digimon["species_number"] != self._species:
+            return False
+        if self._stage is not None and self._database.species_information(
+                digimon["species_number"]).stage != self._stage:
+            return False
+        return all(op(digimon["level"], value)
+                for op, value in self._levels)
+
+
+    def select(self, collection:list) -> list:
+        """Returns the ids of the matching Digimon in one pass.
+
+        Parameters
+        ----------
+        collection: list
+            The user's Digimon as dictionaries.
+
+        Returns
+        -------
+        list:
+            The ids of the matching Digimon in ascending order.
+        """
+        matched = []
+        # species number -> id of the Digimon kept as the original
+        keepers = dict()
+        for digimon_id, digimon in enumerate(collection):
+            if self.duplicates:
+                number = digimon["species_number"]
+                keeper = keepers.get(number)
+                if keeper is None \
+                        or collection[keeper]["level"] < digimon["level"]:
+                    keepers[number] = digimon_id
+            if self._matches(digimon):
+                matched.append(digimon_id)
+        if self.duplicates:
+            kept = set(keepers.values())
+            matched = [i for i in matched if i not in kept]
+        return matched
+
+
+
+def _species_number(database:Database, term:str, value:str) -> int:
+    """Resolves a species given as a number or a name, matched like catch
+    guesses regardless of case, spaces and punctuation.
+
+    Raises
+    ------
+    InvalidFilter
+        No species has that number or name.
+    """
+    if value.isdigit() and int(value) in database.species_numbers():
+        return int(value)
+    matches = database.match_name(value, 0)
+    if not matches:
+        raise InvalidFilter(term, "no such species")
+    return matches[0][1]
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Confirmation Manager Class"""
+import asyncio
+
+
+YES_EMOJI = "\N{WHITE HEAVY CHECK MARK}"
+NO_EMOJI = "\N{NEGATIVE SQUARED CROSS MARK}"
+
+
+
+class ConfirmationManager:
+    """Waits for yes or no reactions to confirmation messages.
+    Pending confirmations are indexed by message id, so one reaction
+    listener resolves any of them in constant time, and each one expires
+    after a timeout instead of waiting forever.
+    """
+    def __init__(self, timeout:float=60.0):
+        """
+        Parameters
+        ----------
+        timeout: float
+            Seconds to wait for an answer. The default is 60.
+        """
+        self.timeout = timeout
+        # message id -> (user id, future)
+        self._pending = dict()
+
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+    async def confirm(self, message_id:int, user_id:int) -> bool:
+        """Waits for a user to answer a confirmation message.
+
+        Parameters
+        ----------
+        message_id: int
+            Id of the message the user reacts to.
+        user_id: int
+            Id of the only user whose answer counts.
+
+        Returns
+        -------
+        bool:
+            True if the user said yes, False if they said no or did not
+            answer in time.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = (user_id, future)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._pending.pop(message_id, None)
+
+
+    def resolve(self, message_id:int, user_id:int, emoji:str) -> None:
+        """Answers a pending confirmation if the reaction belongs to one.
+
+        Parameters
+        ----------
+        message_id: int
+            Id of the message reacted to.
+        user_id: int
+            Id of the user who reacted.
+        emoji: str
+            The reaction.
+        """
+        entry = self._pending.get(message_id)
+        if entry is None or entry[0] != user_id or entry[1].done():
+            return
+        if emoji == YES_EMOJI:
+            entry[1].set_result(True)
+        elif emoji == NO_EMOJI:
+            entry[1].set_result(False)
+
+
+    def cancel_all(self) -> None:
+        """Answers every pending confirmation with no."""
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_result(False)
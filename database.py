@@ -4,9 +4,11 @@ import logging
 import os
 import random
 import json
+from array import array
 random.seed()
 
 from .digimon import Individual, Species, Stage
+from .names import BKTree, normalize_name
 
 
 LOG = logging.getLogger("red.digicord")
@@ -15,6 +17,8 @@ LOG = logging.getLogger("red.digicord")
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 UTIL_DIR = os.path.join(FILE_DIR, "util")
 DATABASE_FILE = os.path.join(UTIL_DIR, "database.json")
+# Stages by their code in the stage column
+STAGES = tuple(Stage)
 
 
 class UnknownSpeciesNumber(Exception):
@@ -26,30 +30,119 @@ class UnknownSpeciesNumber(Exception):
 
 
 
+class InvalidDatabase(Exception):
+    def __init__(self, reason:str):
+        self.reason = reason
+
+    def __str__(self):
+        return f"Invalid species database: {self.reason}"
+
+
+
 class Database:
-    def __init__(self, file_path:str):
-        self._diginfo = dict()
+    """Species information stored as parallel columns in ascending species
+    number order, with Species objects only created when asked for.
+    """
+    def __init__(self, file_path:str=DATABASE_FILE):
+        """
+        Parameters
+        ----------
+        file_path: str
+            The database written by util/crawler.py. The default is
+            util/database.json.
+
+        Raises
+        ------
+        InvalidDatabase
+            The file is not a valid species database.
+        """
+        self.file_path = file_path
         # Read in database
-        database = json.load(open(DATABASE_FILE))
-        for entry in database:
-            self._diginfo[entry['species_number']] = Species(
-                    entry['name'],
-                    entry['species_number'],
-                    Stage.from_string(entry['stage'])
-            )
+        self.mtime = os.stat(file_path).st_mtime
+        try:
+            with open(file_path) as f:
+                database = json.load(f)
+        except ValueError as exp:
+            raise InvalidDatabase(str(exp))
+        _validate(database)
+        database.sort(key=lambda entry: entry['species_number'])
+        self._numbers = array("H", (e['species_number'] for e in database))
+        self._names = [e['name'] for e in database]
+        self._stages = array("B", (STAGES.index(Stage.from_string(
+            e['stage'])) for e in database))
+        # species number -> row in the columns
+        self._rows = {n: row for row, n in enumerate(self._numbers)}
+        # Names as users are expected to type them, indexed for fuzzy lookup
+        normalized = [normalize_name(name) for name in self._names]
+        self._name_index = BKTree()
+        for number, name in zip(self._numbers, normalized):
+            self._name_index.add(name, number)
+        # Species that can spawn
+        self._excluded = set()
+        self._spawn_pool = list(self._numbers)
+
+
+    def species_numbers(self) -> list:
+        """Returns every known species number
+        Returns
+        -------
+        list:
+            The species numbers in ascending order
+        """
+        return list(self._numbers)
+
+
+    def excluded_species(self) -> set:
+        """Returns the species removed from the spawn pool
+        Returns
+        -------
+        set:
+            The excluded species numbers
+        """
+        return set(self._excluded)
+
 
+    def exclude_species(self, species_numbers:set) -> None:
+        """Removes species from the spawn pool.
+        Their information stays available for Digimon already caught.
 
+        Parameters
+        ----------
+        species_numbers: set
+            The species numbers that should no longer spawn.
+        """
+        self._excluded.update(species_numbers)
+        self._spawn_pool = [n for n in self._numbers
+                if n not in self._excluded]
 
-    def random_digimon(self) -> Individual:
+
+    def spawnable_species(self) -> list:
+        """Returns the species that can spawn
+        Returns
+        -------
+        list:
+            Species information in ascending species number order
+        """
+        return [self._species(self._rows[n]) for n in self._spawn_pool]
+
+
+    def random_digimon(self, species_number:int=None) -> Individual:
         """Returns a random Digimon with a random level
+        Parameters
+        ----------
+        species_number: int
+            The species of the Digimon. The default is None, which picks
+            a random species that can spawn.
         Returns
         -------
         Individual:
             A random Digimon with a random level
         """
         # Get a random id number for a Digimon
-        random_species_number = random.randrange(
-                min(self._diginfo), max(self._diginfo)+1)
+        if species_number is None:
+            random_species_number = random.choice(self._spawn_pool)
+        else:
+            random_species_number = species_number
         # Get species info
         spec = self.species_information(random_species_number)
         # Create an Individual
@@ -80,8 +173,58 @@ class Database:
            should never cause this.
         """
         try:
-            return self._diginfo[species_number]
+            return self._species(self._rows[species_number])
         except KeyError:
             LOG.exception(f"No such species number: {id}")
             raise UnknownSpeciesNumber(species_number)
 
+
+    def match_name(self, guess:str, max_distance:int) -> list:
+        """Finds the species whose name is within an edit distance of a guess.
+
+        Parameters
+        ----------
+        guess: str
+            The guessed name, normalized here.
+        max_distance: int
+            The largest edit distance that matches.
+
+        Returns
+        -------
+        list:
+            (distance, species number) tuples, nearest first.
+        """
+        return self._name_index.search(normalize_name(guess), max_distance)
+
+
+    def _species(self, row:int) -> Species:
+        return Species(self._names[row], self._numbers[row],
+                STAGES[self._stages[row]])
+
+
+
+def _validate(database:list) -> None:
+    """Checks every entry of a species database.
+
+    Raises
+    ------
+    InvalidDatabase
+        An entry is malformed or a species number repeats.
+    """
+    if not isinstance(database, list) or not database:
+        raise InvalidDatabase("expected a non-empty list of species")
+    seen = set()
+    for entry in database:
+        try:
+            number = entry['species_number']
+            name = entry['name']
+            Stage.from_string(entry['stage'])
+        except (KeyError, TypeError, AttributeError) as exp:
+            raise InvalidDatabase(f"malformed entry {entry!r}: {exp!r}")
+        if not isinstance(number, int) or not 0 < number < 2**16:
+            raise InvalidDatabase(f"bad species number {number!r}")
+        if not isinstance(name, str) or not name:
+            raise InvalidDatabase(f"bad name for species {number}")
+        if number in seen:
+            raise InvalidDatabase(f"species {number} appears twice")
+        seen.add(number)
@@ -1,9 +1,15 @@
+import asyncio
 import contextlib
+import datetime
 import discord
+import functools
+import io
 import logging
 import os
 import math
 import random
+import threading
+import time
 random.seed()
 from redbot.core import checks, commands, Config
 from redbot.core.data_manager import cog_data_path
@@ -16,59 +22,139 @@ from redbot.core.utils.menus import (
     prev_page,
     start_adding_reactions,
 )
-from redbot.core.utils.predicates import MessagePredicate, ReactionPredicate
+from redbot.core.utils.predicates import MessagePredicate
 import shutil
 
-from .database import Database
-from .digimon import Individual, Species
+from .activity import MessageRate
+from .assets import AssetManifest, field_path, sprite_path
+from .cache import BoundedCache
+from .coalesce import WriteCoalescer
+from .collection_filter import CollectionFilter, InvalidFilter
+from .confirm import ConfirmationManager, NO_EMOJI, YES_EMOJI
+from .database import Database, InvalidDatabase
+from .database import UnknownSpeciesNumber
+from .digimon import Individual, Species, Stage
+from . import exchange
+from .grid import SpriteGrid
+from . import prepared_spawn
+from .prepared_spawn import PreparedSpawn
+from .ratelimit import SlidingWindowLimiter
+from .scheduler import Scheduler
+from . import snapshot
+from .spawn_state import ConfigSpawnBackend, SQLiteSpawnBackend
+from .spawn_table import SpawnTable
+from .stats import InstrumentedConfig, Stats, timed
 
 
 LOG = logging.getLogger("red.digicord")
 
 _DEFAULT_GLOBAL = {
-    "spawn_chance": 1
+    "spawn_chance": 1,
+    "stats_enabled": False,
+    "metrics_interval": 0,
+    "spawn_backend": "config",
+    "spawn_backend_path": None,
+    "database_watch_interval": 0,
+    "catch_tolerance": 1,
+    "catch_rate_limit": 5,
+    "catch_rate_window": 10,
+    "cache_sizes": {}
     }
 _DEFAULT_GUILD = {
     "spawn_channel": None,
-    "current_digimon": None
+    "current_digimon": None,
+    "spawn_chance": None,
+    "stage_weights": {},
+    "allowed_species": [],
+    "blocked_species": [],
+    "allowed_channels": [],
+    "blocked_channels": [],
+    "events": [],
+    "target_spawns_per_hour": None,
+    "message_rate": None,
+    "ambient_spawn_minutes": None
 }
 _DEFAULT_USER = {
     "digimon": [],
     "selected_digimon": None
 }
+# Users exported between writes, which also yield to the event loop
+_TRANSFER_YIELD_EVERY = 500
+# Characters of an import file read at a time
+_TRANSFER_READ_SIZE = 1 << 20
+# Digimon listed when confirming a release
+_RELEASE_PREVIEW = 10
+# Seconds between saves of the guilds' message rates
+_MESSAGE_RATE_SAVE_INTERVAL = 300
+# Seconds an automod immunity result is reused
+_IMMUNITY_TTL = 60
+# Seconds a user's collection is reused before it is read again
+_USER_SESSION_TTL = 5
+# Default entries kept per in-memory cache, owners may change them
+_CACHE_SIZES = {
+    "spawn_tables": 10000,
+    "message_rates": 10000,
+    "prepared_spawns": 10000,
+    "immunity": 4096,
+    "user_sessions": 4096,
+    "catch_limiter": 4096
+}
+# Extra edit distance within which a wrong guess gets a hint
+_CATCH_HINT_MARGIN = 2
+# Largest edit distance a guess may be off by
+_MAX_CATCH_TOLERANCE = 3
+# Seconds to wait for a reaction confirming a deletion or release
+_CONFIRM_TIMEOUT = 60
+# Longest the sampling profiler may run, in seconds
+_MAX_PROFILE_SECONDS = 600
+# Caches saved on unload for the next instance, in the cog's data folder
+_WARM_STATE_FILE = "warm_state.pickle"
+
+
+
+def _restore_message_rate(saved:dict) -> MessageRate:
+    """Returns a saved message rate, or a new one if none was saved."""
+    return MessageRate() if saved is None else MessageRate.from_dict(saved)
 
-# Determine image folder locations
-FILE_DIR = os.path.dirname(os.path.abspath(__file__))
-IMAGES_DIR = os.path.join(FILE_DIR, "images")
-SPRITES_DIR = os.path.join(IMAGES_DIR, "sprites")
-FIELD_DIR = os.path.join(IMAGES_DIR, "field")
 
-def sprite_path(species_number:int) -> str:
-    """Returns the file path for the sprite given a Digimon number.
+def _import_user(collection:list, selected:int, merge:bool, state:dict)\
+        -> None:
+    """Replaces a user's Digimon with imported ones, or appends them.
     Parameters
     ----------
-    species_number: int
-        The number to get the sprite image for.
-    Returns
-    -------
-    str:
-        The file path for the sprite image.
+    collection: list
+        The imported Digimon as dictionaries.
+    selected: int
+        The imported selected Digimon id, may be None.
+    merge: bool
+        Append to the existing Digimon instead of replacing them.
+    state: dict
+        The user's Digimon and selected Digimon id, changed in place.
     """
-    return os.path.join(SPRITES_DIR, f"sprite-{species_number:03d}.png")
-
-
-def field_path(species_number:int) -> str:
-    """Returns the file path for the field image given a Digimon number.
+    if not merge:
+        state["digimon"] = collection
+        state["selected_digimon"] = selected
+        return
+    # Imported ids shift past the existing Digimon
+    offset = len(state["digimon"])
+    state["digimon"].extend(collection)
+    if selected is not None and state["selected_digimon"] is None:
+        state["selected_digimon"] = offset + selected
+
+
+def _format_time(timestamp:float) -> str:
+    """Returns a Unix time as readable UTC.
     Parameters
     ----------
-    species_number: int
-        The number to get the field image for.
+    timestamp: float
+        The Unix time.
     Returns
     -------
     str:
-        The file path for the field image.
+        The time such as 2020-07-25 18:00 UTC.
     """
-    return os.path.join(FIELD_DIR, f"field-{species_number:03d}.png")
+    return datetime.datetime.utcfromtimestamp(timestamp)\
+            .strftime("%Y-%m-%d %H:%M UTC")
 
 
 
@@ -111,9 +197,605 @@ class Digicord(commands.Cog):
         self._conf.register_global(**_DEFAULT_GLOBAL)
         self._conf.register_guild(**_DEFAULT_GUILD)
         self._conf.register_user(**_DEFAULT_USER)
-        self.database = Database("")
+        # self._conf is swapped for an instrumented wrapper while stats are on
+        self._raw_conf = self._conf
+        self.stats = Stats()
+        self._metrics_task = None
+        self.spawn_state = ConfigSpawnBackend(lambda: self._conf)
+        # Compiled spawn settings per guild id, see _spawn_table
+        self._spawn_chance = _DEFAULT_GLOBAL["spawn_chance"]
+        self._spawn_tables = BoundedCache(_CACHE_SIZES["spawn_tables"])
+        self._catch_tolerance = _DEFAULT_GLOBAL["catch_tolerance"]
+        # Automod immunity per guild id, member id and role ids
+        self._immunity = BoundedCache(_CACHE_SIZES["immunity"],
+                ttl=_IMMUNITY_TTL)
+        # Catch attempts per guild and user id pair
+        self.catch_limiter = SlidingWindowLimiter(
+                _DEFAULT_GLOBAL["catch_rate_limit"],
+                _DEFAULT_GLOBAL["catch_rate_window"],
+                _CACHE_SIZES["catch_limiter"])
+        self.stats.set_gauge("catch.rate_limited",
+                lambda: self.catch_limiter.rejected)
+        # Spawn events: the running one per guild id, and tables compiled
+        # ahead of time per guild id and event id
+        self.scheduler = Scheduler()
+        self._active_events = dict()
+        self._event_tables = dict()
+        # Message rate per guild id targeting spawns per hour, saved when
+        # evicted and every few minutes
+        self._message_rates = BoundedCache(_CACHE_SIZES["message_rates"],
+                write_back=self._write_message_rate)
+        # Next spawn per guild id, rolled after the previous one
+        self._next_spawns = BoundedCache(_CACHE_SIZES["prepared_spawns"])
+        # Deletions and releases waiting for a reaction
+        self.confirmations = ConfirmationManager(_CONFIRM_TIMEOUT)
+        self.stats.set_gauge("confirmations.pending",
+                lambda: len(self.confirmations))
+        # Collections and selected ids per user id read lately
+        self.user_sessions = BoundedCache(_CACHE_SIZES["user_sessions"],
+                ttl=_USER_SESSION_TTL)
+        # Changes to a user's Digimon queued together are written together
+        self.user_writes = WriteCoalescer(self._read_user_state,
+                self._write_user_state)
+        self.stats.set_gauge("user_writes.operations",
+                lambda: self.user_writes.operations)
+        self.stats.set_gauge("user_writes.writes",
+                lambda: self.user_writes.writes)
+        # Per guild and per user state, bounded by the sizes owners set
+        self.caches = {
+            "spawn_tables": self._spawn_tables,
+            "message_rates": self._message_rates,
+            "prepared_spawns": self._next_spawns,
+            "immunity": self._immunity,
+            "user_sessions": self.user_sessions,
+            "catch_limiter": self.catch_limiter.attempts
+        }
+        for name, cache in self.caches.items():
+            for counter in ("hits", "misses", "evictions", "reloads"):
+                self.stats.set_gauge(f"cache.{name}.{counter}",
+                        lambda cache=cache, counter=counter:
+                        getattr(cache, counter))
+            self.stats.set_gauge(f"cache.{name}.size",
+                    lambda cache=cache: len(cache))
+        # Caches left behind by the previous instance, see cog_unload
+        self._warm_state_path = os.path.join(cog_data_path(self),
+                _WARM_STATE_FILE)
+        warm = snapshot.load(self._warm_state_path)
+        if warm is not None and warm.database is not None:
+            self.database = warm.database
+            self._assets_verified = warm.assets_verified
+        else:
+            self.database = Database()
+            self._assets_verified = False
+        # Sampling profiler while one runs, imported only when started
+        self._profiler = None
+        self.assets = AssetManifest()
+        self.sprite_grid = SpriteGrid(os.path.join(cog_data_path(self),
+            "sprite_grids"), version=self.assets.sprite_version())
+        for name in ("memory_hits", "disk_hits", "renders"):
+            self.stats.set_gauge(f"sprite_grid.{name}",
+                    lambda name=name: getattr(self.sprite_grid, name))
+        # Keep species with missing images out of the spawn pool
+        if not self._assets_verified:
+            broken = self.assets.check_presence(
+                    self.database.species_numbers())
+            if broken:
+                LOG.warning(f"Not spawning species with broken images: "\
+                        f"{sorted(broken)}")
+                self.database.exclude_species(broken)
+        self._verify_assets_task = asyncio.create_task(self.verify_assets())
+        self._warm_up_task = None
+        if warm is not None:
+            self._restore_warm_state(warm)
+
+
+    async def initialize(self) -> None:
+        """Loads the settings needed before handling any event."""
+        self._set_stats_enabled(await self._conf.stats_enabled())
+        self._spawn_chance = await self._conf.spawn_chance()
+        self._catch_tolerance = await self._conf.catch_tolerance()
+        self.catch_limiter.configure(await self._conf.catch_rate_limit(),
+                await self._conf.catch_rate_window())
+        for name, size in (await self._conf.cache_sizes()).items():
+            if name in self.caches:
+                self.caches[name].resize(size)
+        self._start_metrics_task(await self._conf.metrics_interval())
+        self._set_spawn_backend(await self._conf.spawn_backend(),
+                await self._conf.spawn_backend_path())
+        self.scheduler.start()
+        self._watch_database(await self._conf.database_watch_interval())
+        self.scheduler.schedule("message_rates_save",
+                time.time() + _MESSAGE_RATE_SAVE_INTERVAL,
+                self._save_message_rates)
+        for guild_id, settings in (await self._conf.all_guilds()).items():
+            for event in settings.get("events", []):
+                self._schedule_event(guild_id, event, settings)
+            if settings.get("ambient_spawn_minutes"):
+                self._schedule_ambient_spawn(guild_id,
+                        settings["ambient_spawn_minutes"], first=True)
+
+
+    def cog_unload(self) -> None:
+        self._verify_assets_task.cancel()
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+        self.spawn_state.close()
+        self.scheduler.stop()
+        self.confirmations.cancel_all()
+        if self._profiler is not None:
+            self._profiler.stop()
+        self._save_warm_state()
+
+
+    def _save_warm_state(self) -> None:
+        """Saves the caches worth keeping across a reload. Message rates
+            changed since the last save are only saved here.
+        """
+        state = snapshot.WarmState()
+        state.database = self.database
+        state.assets_verified = self._assets_verified
+        # Tables of running events are compiled again when they start
+        state.spawn_tables = {guild_id: table for guild_id, table
+                in self._spawn_tables.items()
+                if guild_id not in self._active_events}
+        state.message_rates = {guild_id: rate.to_dict() for guild_id, rate
+                in self._message_rates.items()}
+        state.prepared_spawns = {guild_id: prepared.individual.to_dict()
+                for guild_id, prepared in self._next_spawns.items()
+                if state.spawn_tables.get(guild_id) is prepared.table}
+        state.image_species = prepared_spawn.cached_species()
+        try:
+            snapshot.save(self._warm_state_path, state)
+        except OSError as exp:
+            LOG.warning(f"Could not save warm state: {exp}")
+
+
+    def _restore_warm_state(self, warm:snapshot.WarmState) -> None:
+        """Fills the caches from the previous instance's warm state.
+        Parameters
+        ----------
+        warm: snapshot.WarmState
+            The state saved when the previous instance was unloaded.
+        """
+        for guild_id, table in warm.spawn_tables.items():
+            self._spawn_tables.put(guild_id, table)
+        # Newer than the saved rates, so written back again
+        for guild_id, rate in warm.message_rates.items():
+            self._message_rates.put(guild_id, MessageRate.from_dict(rate),
+                    dirty=True)
+        self._warm_up_task = asyncio.create_task(self._warm_up(warm))
+        LOG.info(f"Restored warm state of "\
+                f"{len(warm.spawn_tables)} spawn tables and "\
+                f"{len(warm.message_rates)} message rates")
+
+
+    async def _warm_up(self, warm:snapshot.WarmState) -> None:
+        """Reads the images that were in memory back in, then prepares the
+            spawns that were prepared.
+        Parameters
+        ----------
+        warm: snapshot.WarmState
+            The state saved when the previous instance was unloaded.
+        """
+        try:
+            await prepared_spawn.preload_images(warm.image_species)
+        except OSError as exp:
+            LOG.warning(f"Could not preload images: {exp}")
+        for guild_id, entry in warm.prepared_spawns.items():
+            table = warm.spawn_tables[guild_id]
+            individual = Individual.from_dict(entry)
+            try:
+                images = await prepared_spawn.load_images(
+                        individual.species_number)
+            except OSError:
+                continue
+            # Only if nothing spawned or changed the table meanwhile
+            if self._spawn_tables.get(guild_id) is table \
+                    and self._next_spawns.get(guild_id) is None:
+                self._next_spawns.put(guild_id,
+                        PreparedSpawn(table, individual, *images))
+
+
+    async def cog_before_invoke(self, ctx: commands.Context) -> None:
+        ctx.digicord_start = time.perf_counter()
+
+
+    async def cog_after_invoke(self, ctx: commands.Context) -> None:
+        self.stats.observe(f"command.{ctx.command.qualified_name}",
+                time.perf_counter() - ctx.digicord_start)
+
+
+    def _set_stats_enabled(self, enabled:bool) -> None:
+        """Turns recording of stats on or off.
+        Parameters
+        ----------
+        enabled: bool
+            Whether stats are recorded.
+        """
+        self.stats.enabled = enabled
+        if enabled:
+            self._conf = InstrumentedConfig(self._raw_conf, self.stats)
+        else:
+            self._conf = self._raw_conf
+
+
+    def _set_spawn_backend(self, kind:str, file_path:str=None) -> None:
+        """Switches where spawns are kept.
+        Parameters
+        ----------
+        kind: str
+            "config" for Config, which assumes a single bot process, or
+            "sqlite" for a SQLite file shared by several processes.
+        file_path: str
+            Location of the SQLite file. The default is spawns.sqlite3 in
+            the cog's data folder.
+        """
+        self.spawn_state.close()
+        if kind == "sqlite":
+            if file_path is None:
+                file_path = os.path.join(cog_data_path(self),
+                        "spawns.sqlite3")
+            self.spawn_state = SQLiteSpawnBackend(file_path)
+        else:
+            self.spawn_state = ConfigSpawnBackend(lambda: self._conf)
+
+
+    def _start_metrics_task(self, interval:int) -> None:
+        """(Re)starts periodic writing of the Prometheus metrics file.
+        Parameters
+        ----------
+        interval: int
+            Seconds between writes, 0 stops writing.
+        """
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+            self._metrics_task = None
+        if interval > 0:
+            self._metrics_task = asyncio.create_task(
+                    self._write_metrics(interval))
+
+
+    async def _write_metrics(self, interval:int) -> None:
+        """Writes the Prometheus metrics file every interval seconds.
+        Parameters
+        ----------
+        interval: int
+            Seconds between writes.
+        """
+        file_path = os.path.join(cog_data_path(self), "metrics.prom")
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if not self.stats.enabled:
+                continue
+            try:
+                await loop.run_in_executor(None,
+                        self.stats.write_prometheus, file_path)
+            except OSError as exp:
+                LOG.warning(f"Could not write metrics: {exp}")
+
+
+    async def verify_assets(self) -> None:
+        """Verifies every image hash in the background and excludes species
+            whose images are corrupt from the spawn pool.
+        """
+        if self._assets_verified:
+            return
+        loop = asyncio.get_running_loop()
+        broken = await loop.run_in_executor(None, self.assets.verify_hashes,
+                self.database.species_numbers())
+        if broken:
+            LOG.warning(f"Not spawning species with corrupt images: "\
+                    f"{sorted(broken)}")
+            self.database.exclude_species(broken)
+            self._invalidate_spawn_table()
+        else:
+            LOG.info("All Digimon images match the asset manifest")
+        self._assets_verified = True
+
+
+    def _load_database(self, force:bool) -> (Database, AssetManifest):
+        """Loads and prepares the species database file and the asset
+            manifest for a swap. Runs in the thread pool.
+        Parameters
+        ----------
+        force: bool
+            Load it even if species that exist now are missing from it.
+        Returns
+        -------
+        Database:
+            The new database with its spawn pool ready.
+        AssetManifest:
+            The asset manifest as it is now on disk.
+        Raises
+        ------
+        InvalidDatabase
+            The file is invalid, or misses species without force.
+        """
+        database = Database(self.database.file_path)
+        missing = set(self.database.species_numbers())\
+                - set(database.species_numbers())
+        if missing and not force:
+            raise InvalidDatabase(f"species {sorted(missing)} are missing, "\
+                    "which caught Digimon may still be")
+        # Images may have been refreshed along with the database, so only
+        # the current manifest decides which species are excluded
+        assets = AssetManifest()
+        broken = assets.check_presence(database.species_numbers())
+        if broken:
+            LOG.warning(f"Not spawning species with broken images: "\
+                    f"{sorted(broken)}")
+        database.exclude_species(broken)
+        return database, assets
+
+
+    async def reload_database(self, force:bool=False) -> Database:
+        """Loads the species database file off the event loop and swaps it
+            in, so commands only ever see a complete database.
+        Parameters
+        ----------
+        force: bool
+            Load it even if species that exist now are missing from it,
+            as long as no user owns a Digimon of one. The default is False.
+        Returns
+        -------
+        Database:
+            The new database.
+        Raises
+        ------
+        InvalidDatabase
+            The file is invalid, or misses species without force, or
+            misses species that users own.
+        """
+        loop = asyncio.get_running_loop()
+        database, assets = await loop.run_in_executor(None,
+                self._load_database, force)
+        missing = set(self.database.species_numbers())\
+                - set(database.species_numbers())
+        if missing:
+            owners = await self._owners_of_species(missing)
+            if owners:
+                raise InvalidDatabase(f"species {sorted(missing)} are "\
+                        f"missing, which {len(owners)} users own")
+        # Nothing awaits between the swap and dropping the spawn tables
+        # compiled from the old database
+        self.database = database
+        self.assets = assets
+        self.sprite_grid.version = assets.sprite_version()
+        self._invalidate_spawn_table()
+        self._verify_assets_task.cancel()
+        self._assets_verified = False
+        self._verify_assets_task = asyncio.create_task(self.verify_assets())
+        LOG.info(f"Reloaded {len(database.species_numbers())} species "\
+                f"from {database.file_path}")
+        return database
+
+
+    async def _owners_of_species(self, species_numbers:set) -> set:
+        """Finds the users who own a Digimon of any of the given species.
+        Parameters
+        ----------
+        species_numbers: set
+            The species to look for.
+        Returns
+        -------
+        set:
+            The ids of the users owning one.
+        """
+        owners = set()
+        for user_id, data in (await self._conf.all_users()).items():
+            if any(d["species_number"] in species_numbers
+                    for d in data["digimon"]):
+                owners.add(user_id)
+        # Sessions hold the latest collections, checked after the last
+        # await so nothing caught meanwhile is missed
+        for user_id, (collection, _) in self.user_sessions.items():
+            if any(d["species_number"] in species_numbers
+                    for d in collection):
+                owners.add(user_id)
+        return owners
+
+
+    def _watch_database(self, interval:int) -> None:
+        """(Re)starts reloading the species database when its file changes.
+        Parameters
+        ----------
+        interval: int
+            Seconds between checks of the file, 0 stops checking.
+        """
+        self.scheduler.cancel("database_watch")
+        if interval <= 0:
+            return
+        # Modification time of a file that failed to load, not retried
+        rejected_mtime = None
+        async def check():
+            nonlocal rejected_mtime
+            self.scheduler.schedule("database_watch",
+                    time.time() + interval, check)
+            try:
+                mtime = os.stat(self.database.file_path).st_mtime
+                if mtime not in (self.database.mtime, rejected_mtime):
+                    await self.reload_database()
+            except InvalidDatabase as exp:
+                rejected_mtime = mtime
+                LOG.warning(f"Not reloading species database: {exp}")
+            except OSError as exp:
+                # Missing or being replaced, so tried again next time
+                LOG.warning(f"Could not check species database: {exp}")
+        self.scheduler.schedule("database_watch", time.time() + interval,
+                check)
+
+
+    async def _spawn_table(self, guild:discord.Guild) -> SpawnTable:
+        """Returns the compiled spawn settings of a guild, compiling them
+            from Config on first use.
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to get the spawn settings of.
+        Returns
+        -------
+        SpawnTable:
+            The compiled spawn settings.
+        """
+        table = self._spawn_tables.get(guild.id)
+        if table is None:
+            settings = await self._conf.guild(guild).all()
+            table = SpawnTable.compile(self.database, self._spawn_chance,
+                    settings, self._active_events.get(guild.id))
+            self._spawn_tables.put(guild.id, table)
+            if table.target_per_hour is not None \
+                    and self._message_rates.get(guild.id) is None:
+                self._message_rates.put(guild.id,
+                        _restore_message_rate(settings["message_rate"]))
+        return table
+
+
+    async def _save_message_rates(self) -> None:
+        """Saves the message rates that changed, then schedules the next
+            save. Rates are only kept in memory in between.
+        """
+        self.scheduler.schedule("message_rates_save",
+                time.time() + _MESSAGE_RATE_SAVE_INTERVAL,
+                self._save_message_rates)
+        await self._message_rates.flush()
+
+
+    async def _write_message_rate(self, guild_id:int, rate:MessageRate)\
+            -> None:
+        """Saves the message rate of a guild."""
+        await self._conf.guild_from_id(guild_id).message_rate.set(
+                rate.to_dict())
 
 
+    def _invalidate_spawn_table(self, guild:discord.Guild=None) -> None:
+        """Drops compiled spawn settings after they changed.
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild whose settings changed. The default is None, which
+            drops the settings of every guild.
+        """
+        if guild is None:
+            self._spawn_tables.clear()
+            self._event_tables.clear()
+        else:
+            self._spawn_tables.invalidate(guild.id)
+            self._event_tables.pop(guild.id, None)
+
+
+    def _schedule_event(self, guild_id:int, event:dict, settings:dict)\
+            -> None:
+        """Compiles the spawn table of an event and schedules its start
+            and end, so nothing about the event is checked per message.
+        Parameters
+        ----------
+        guild_id: int
+            The guild the event is in.
+        event: dict
+            The event as saved in the guild's Config.
+        settings: dict
+            All Config values of the guild.
+        """
+        self._event_tables.setdefault(guild_id, {})[event["id"]] = \
+                SpawnTable.compile(self.database, self._spawn_chance,
+                        settings, event)
+        if event["end"] > time.time():
+            self.scheduler.schedule(("event_start", guild_id, event["id"]),
+                    event["start"], lambda: self._start_event(guild_id, event))
+        self.scheduler.schedule(("event_end", guild_id, event["id"]),
+                event["end"], lambda: self._end_event(guild_id, event["id"]))
+
+
+    def _schedule_ambient_spawn(self, guild_id:int, minutes:int,
+            first:bool=False) -> None:
+        """Schedules the next ambient spawn of a guild.
+        Parameters
+        ----------
+        guild_id: int
+            The guild to spawn in.
+        minutes: int
+            Minutes between ambient spawns.
+        first: bool
+            Pick a random time within the first interval, so guilds
+            loaded together do not spawn together. The default is False.
+        """
+        interval = minutes * 60
+        delay = random.uniform(0, interval) if first else interval
+        self.scheduler.schedule(("ambient_spawn", guild_id),
+                time.time() + delay,
+                lambda: self._ambient_spawn(guild_id, minutes))
+
+
+    async def _ambient_spawn(self, guild_id:int, minutes:int) -> None:
+        """Spawns a Digimon in a guild's spawn channel unless one is still
+            waiting to be caught, then schedules the next ambient spawn.
+        Parameters
+        ----------
+        guild_id: int
+            The guild to spawn in.
+        minutes: int
+            Minutes between ambient spawns.
+        """
+        self._schedule_ambient_spawn(guild_id, minutes)
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+        table = await self._spawn_table(guild)
+        if table.spawn_channel is None:
+            return
+        channel = self.bot.get_channel(table.spawn_channel)
+        if channel is None:
+            return
+        if await self.spawn_state.current(guild_id) is not None:
+            return
+        self.stats.count("spawn.ambient")
+        await self.spawn_digimon(channel)
+
+
+    async def _start_event(self, guild_id:int, event:dict) -> None:
+        """Swaps in the spawn table of an event.
+        Parameters
+        ----------
+        guild_id: int
+            The guild the event is in.
+        event: dict
+            The event that starts.
+        """
+        self._active_events[guild_id] = event
+        table = self._event_tables.get(guild_id, {}).pop(event["id"], None)
+        if table is None:
+            # Settings changed since scheduling, compile on next use
+            self._spawn_tables.invalidate(guild_id)
+        else:
+            self._spawn_tables.put(guild_id, table)
+        LOG.info(f"Started event {event['id']} in guild {guild_id}")
+
+
+    async def _end_event(self, guild_id:int, event_id:int) -> None:
+        """Swaps the spawn table of an event back out and forgets it.
+        Parameters
+        ----------
+        guild_id: int
+            The guild the event is in.
+        event_id: int
+            The event that ends.
+        """
+        self.scheduler.cancel(("event_start", guild_id, event_id))
+        self.scheduler.cancel(("event_end", guild_id, event_id))
+        self._event_tables.get(guild_id, {}).pop(event_id, None)
+        active = self._active_events.get(guild_id)
+        if active is not None and active["id"] == event_id:
+            del self._active_events[guild_id]
+            self._spawn_tables.invalidate(guild_id)
+        async with self._conf.guild_from_id(guild_id).events() as events:
+            events[:] = [e for e in events if e["id"] != event_id]
+        LOG.info(f"Ended event {event_id} in guild {guild_id}")
+
+
+    @timed("_embed_msg")
     async def _embed_msg(self, ctx: commands.Context, title:str,
             description:str, image_file:discord.File=None,
             thumbnail_file:discord.File=None) -> None:
@@ -160,14 +842,83 @@ class Digicord(commands.Cog):
         valid_user = isinstance(author, discord.Member) and not author.bot
         if not valid_user:
             return
-        if await self.bot.is_automod_immune(message):
+        # Cheapest checks first, so messages that will not spawn anything
+        # never wait on the automod immunity check
+        table = await self._spawn_table(message.guild)
+        if not table.allows_channel(message.channel.id):
+            return
+        if table.target_per_hour is None:
+            spawn = table.roll()
+        else:
+            rate = self._message_rates.get(message.guild.id)
+            if rate is None:
+                # Evicted since the spawn table was compiled
+                rate = _restore_message_rate(
+                        await self._conf.guild(message.guild).message_rate())
+                self._message_rates.put(message.guild.id, rate)
+            spawn = table.roll(rate.observe())
+            self._message_rates.mark_dirty(message.guild.id)
+        if not spawn:
+            return
+        if await self._is_automod_immune(message):
             return
+        await self.spawn_digimon(message.channel)
 
-        # Maybe spawn Digimon 
-        if random.randrange(0,100) < await self._conf.spawn_chance():
-            await self.spawn_digimon(message.channel)
+
+    async def _is_automod_immune(self, message:discord.Message) -> bool:
+        """Checks whether the author of a message is immune to automod,
+            reusing the result for the same member and roles for a minute.
+        Parameters
+        ----------
+        message: discord.Message
+            The message to check the author of.
+        Returns
+        -------
+        bool:
+            True if the author is immune, else False.
+        """
+        author = message.author
+        key = (message.guild.id, author.id,
+                tuple(role.id for role in author.roles))
+        immune = self._immunity.get(key)
+        if immune is None:
+            immune = await self.bot.is_automod_immune(message)
+            self._immunity.put(key, immune)
+        return immune
 
 
+    @commands.Cog.listener()
+    async def on_reaction_add(self, reaction:discord.Reaction,
+            user:discord.User) -> None:
+        self.confirmations.resolve(reaction.message.id, user.id,
+                str(reaction.emoji))
+
+
+    async def _take_prepared_spawn(self, guild_id:int, table:SpawnTable)\
+            -> PreparedSpawn:
+        """Returns a guild's prepared spawn, preparing one now if there is
+            none for its current spawn table.
+        Parameters
+        ----------
+        guild_id: int
+            The guild to spawn in.
+        table: SpawnTable
+            The guild's current spawn table.
+        Returns
+        -------
+        PreparedSpawn:
+            The spawn, no longer held for the guild.
+        """
+        prepared = self._next_spawns.pop(guild_id, None)
+        if prepared is not None and prepared.table is table:
+            self.stats.count("spawn.prepared")
+            return prepared
+        # Settings changed since it was rolled, or nothing was rolled yet
+        self.stats.count("spawn.unprepared")
+        return await PreparedSpawn.prepare(table, self.database)
+
+
+    @timed("spawn_digimon")
     async def spawn_digimon(self, channel:discord.TextChannel) -> None:
         """Spawns a random Digimon.
         Parameters
@@ -175,28 +926,36 @@ class Digicord(commands.Cog):
         channel: discord.TextChannel
             The channel that the random Digimon will appear in.
         """
+        table = await self._spawn_table(channel.guild)
         # Get proper spawn channel
-        channel_id = await self._conf.guild(channel.guild).spawn_channel()
-        if channel_id is not None:
-            channel = self.bot.get_channel(channel_id)
-
-        # Randomly select a Digimon
-        d = self.database.random_digimon()
+        if table.spawn_channel is not None:
+            channel = self.bot.get_channel(table.spawn_channel) or channel
+        if not table.species:
+            LOG.warning(f"No Digimon can spawn in guild {channel.guild.id}")
+            return
 
-        # Save this digimon's existence so it can be caught
-        await self._conf.guild(channel.guild).current_digimon.set(
-                d.to_dict())
+        # The Digimon, its embed and images were readied after the last spawn
+        prepared = await self._take_prepared_spawn(channel.guild.id, table)
+        d = prepared.individual
 
+        # Save this digimon's existence so it can be caught while sending.
+        # Guesses come in reply to the message, long after the save finished
+        saving = asyncio.ensure_future(
+                self.spawn_state.spawn(channel.guild.id, d))
+        try:
+            await channel.send(embed=prepared.embed, files=prepared.files())
+        finally:
+            await saving
         LOG.info(f"Spawned Digimon: \"{d.to_dict()}\" in guild " \
                 f"{channel.guild.id}, channel {channel.id}")
-        # Send the data
-        await self._embed_msg(
-                ctx=channel,
-                title="A Wild Digimon has Appeared!",
-                description="",
-                image_file=discord.File(field_path(d.species_number)),
-                thumbnail_file=discord.File(sprite_path(d.species_number))
-            )
+
+        # Roll the next one now, so the next spawn only has to send it
+        try:
+            self._next_spawns.put(channel.guild.id,
+                    await PreparedSpawn.prepare(table, self.database))
+        except OSError as exp:
+            LOG.warning(f"Could not prepare the next spawn in guild " \
+                    f"{channel.guild.id}: {exp}")
 
 
     @commands.group()
@@ -220,6 +979,7 @@ class Digicord(commands.Cog):
         """
         if channel is None:
             await self._conf.guild(ctx.guild).spawn_channel.set(None)
+            self._invalidate_spawn_table(ctx.guild)
             LOG.info(f"In guild {ctx.guild.id} set spawn channel to: any")
             await self._embed_msg(
                     ctx=ctx,
@@ -228,6 +988,7 @@ class Digicord(commands.Cog):
                 )
         else:
             await self._conf.guild(ctx.guild).spawn_channel.set(channel.id)
+            self._invalidate_spawn_table(ctx.guild)
             LOG.info(f"In guild {ctx.guild.id} set spawn channel to: "\
                     f"{channel.id}")
             await self._embed_msg(
@@ -250,6 +1011,8 @@ class Digicord(commands.Cog):
         """
         if 0 < spawn_chance <= 100:
             await self._conf.spawn_chance.set(spawn_chance)
+            self._spawn_chance = spawn_chance
+            self._invalidate_spawn_table()
             LOG.info(f"Set spawn chance to {spawn_chance}%")
             title="Set Spawn Chance: Success"
             description=f"Spawn chance set to {spawn_chance}%"
@@ -266,7 +1029,854 @@ class Digicord(commands.Cog):
     async def command_spawn_digimon(self, ctx: commands.Context) -> None:
         """Spawns a random Digimon in the current server.
         """
-        await self.spawn_digimon(ctx)
+        await self.spawn_digimon(ctx.channel)
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="set_guild_spawn_chance")
+    async def set_guild_spawn_chance(self, ctx: commands.Context,
+            spawn_chance:int=None) -> None:
+        """Sets the spawn chance of this server. If no argument is given
+            then the bot wide spawn chance is used.
+
+        Parameters
+        ----------
+        spawn_chance: int
+            Chance in percent that a message spawns a Digimon.
+        """
+        if spawn_chance is None or 0 < spawn_chance <= 100:
+            await self._conf.guild(ctx.guild).spawn_chance.set(spawn_chance)
+            self._invalidate_spawn_table(ctx.guild)
+            shown = "default" if spawn_chance is None else f"{spawn_chance}%"
+            LOG.info(f"In guild {ctx.guild.id} set spawn chance to {shown}")
+            title = "Set Spawn Chance: Success"
+            description = f"Spawn chance set to {shown}"
+        else:
+            title = "Set Spawn Chance: Failure"
+            description = f"Spawn chance has to be (0,100], which is not "\
+                    f"{spawn_chance}"
+        await self._embed_msg(ctx, title, description)
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="set_target_spawns_per_hour")
+    async def set_target_spawns_per_hour(self, ctx: commands.Context,
+            target:float=None) -> None:
+        """Makes spawns follow the activity of this server, aiming for a
+            number of spawns per hour however many messages are sent.
+            If no argument is given then the spawn chance is used again.
+
+        Parameters
+        ----------
+        target: float
+            Spawns per hour to aim for.
+        """
+        if target is None or target > 0:
+            await self._conf.guild(ctx.guild).target_spawns_per_hour.set(
+                    target)
+            self._invalidate_spawn_table(ctx.guild)
+            shown = "off" if target is None else f"{target:g} per hour"
+            LOG.info(f"In guild {ctx.guild.id} set target spawns to {shown}")
+            title = "Set Target Spawns: Success"
+            description = f"Target spawns set to {shown}"
+        else:
+            title = "Set Target Spawns: Failure"
+            description = f"Target spawns has to be positive, which is not "\
+                    f"{target:g}"
+        await self._embed_msg(ctx, title, description)
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="set_ambient_spawns")
+    async def set_ambient_spawns(self, ctx: commands.Context,
+            minutes:int=None) -> None:
+        """Spawns a Digimon in the spawn channel every so many minutes,
+            unless one is still waiting to be caught. If no argument is
+            given then Digimon only spawn from messages.
+
+        Parameters
+        ----------
+        minutes: int
+            Minutes between ambient spawns.
+        """
+        if minutes is not None and minutes <= 0:
+            title = "Set Ambient Spawns: Failure"
+            description = f"Minutes have to be positive, which is not "\
+                    f"{minutes}"
+        elif minutes is not None \
+                and await self._conf.guild(ctx.guild).spawn_channel() is None:
+            title = "Set Ambient Spawns: Failure"
+            description = "Set a spawn channel first"
+        else:
+            await self._conf.guild(ctx.guild).ambient_spawn_minutes.set(
+                    minutes)
+            if minutes is None:
+                self.scheduler.cancel(("ambient_spawn", ctx.guild.id))
+                shown = "off"
+            else:
+                self._schedule_ambient_spawn(ctx.guild.id, minutes)
+                shown = f"every {minutes} minutes"
+            LOG.info(f"In guild {ctx.guild.id} set ambient spawns to {shown}")
+            title = "Set Ambient Spawns: Success"
+            description = f"Ambient spawns set to {shown}"
+        await self._embed_msg(ctx, title, description)
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="set_stage_weight")
+    async def set_stage_weight(self, ctx: commands.Context, stage:str,
+            weight:float) -> None:
+        """Sets how likely Digimon of a stage spawn in this server,
+            relative to the default weight of 1. A weight of 0 stops the
+            stage from spawning.
+
+        Parameters
+        ----------
+        stage: str
+            The stage, such as Rookie or In-Training.
+        weight: float
+            The relative weight of each Digimon of the stage.
+        """
+        try:
+            stage = Stage.from_string(stage).value
+        except KeyError:
+            stages = ", ".join(s.value for s in Stage)
+            await self._embed_msg(ctx, "Set Stage Weight: Failure",
+                    f"Stage has to be one of {stages}")
+            return
+        if weight < 0:
+            await self._embed_msg(ctx, "Set Stage Weight: Failure",
+                    "Weight can not be negative")
+            return
+        async with self._conf.guild(ctx.guild).stage_weights() as weights:
+            if weight == 1:
+                weights.pop(stage, None)
+            else:
+                weights[stage] = weight
+        self._invalidate_spawn_table(ctx.guild)
+        LOG.info(f"In guild {ctx.guild.id} set {stage} weight to {weight}")
+        await self._embed_msg(ctx, "Set Stage Weight: Success",
+                f"{stage} weight set to {weight}")
+
+
+    async def _edit_guild_ids(self, ctx: commands.Context, key:str,
+            item_id:int, add:bool, label:str) -> None:
+        """Adds an id to or removes it from a list in the guild's Config
+            and reports the result.
+        Parameters
+        ----------
+        key: str
+            The Config key of the list.
+        item_id: int
+            The species number or channel id.
+        add: bool
+            True to add the id, False to remove it.
+        label: str
+            Human readable name of the list.
+        """
+        async with self._conf.guild(ctx.guild).get_attr(key)() as ids:
+            if add and item_id not in ids:
+                ids.append(item_id)
+            elif not add and item_id in ids:
+                ids.remove(item_id)
+        self._invalidate_spawn_table(ctx.guild)
+        verb = "Added to" if add else "Removed from"
+        LOG.info(f"In guild {ctx.guild.id} {verb.lower()} {key}: {item_id}")
+        await self._embed_msg(ctx, f"{verb} {label}",
+                f"{verb} {label}: {item_id}")
+
+
+    async def _species_exists(self, ctx: commands.Context,
+            species_number:int) -> bool:
+        """Checks a species number given by an admin, telling them if it
+            does not exist.
+        Parameters
+        ----------
+        species_number: int
+            The species number to check.
+        Returns
+        -------
+        bool:
+            True if the species exists, else False.
+        """
+        try:
+            self.database.species_information(species_number)
+            return True
+        except UnknownSpeciesNumber:
+            await self._embed_msg(ctx, "Unknown Species",
+                    f"No Digimon has species number {species_number}")
+            return False
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="allow_species")
+    async def allow_species(self, ctx: commands.Context,
+            species_number:int) -> None:
+        """Adds a species to the allowed species of this server. Once any
+            species is allowed, only allowed species spawn.
+
+        Parameters
+        ----------
+        species_number: int
+            The species number to allow.
+        """
+        if await self._species_exists(ctx, species_number):
+            await self._edit_guild_ids(ctx, "allowed_species",
+                    species_number, True, "Allowed Species")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="disallow_species")
+    async def disallow_species(self, ctx: commands.Context,
+            species_number:int) -> None:
+        """Removes a species from the allowed species of this server.
+
+        Parameters
+        ----------
+        species_number: int
+            The species number to remove.
+        """
+        await self._edit_guild_ids(ctx, "allowed_species", species_number,
+                False, "Allowed Species")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="block_species")
+    async def block_species(self, ctx: commands.Context,
+            species_number:int) -> None:
+        """Stops a species from spawning in this server.
+
+        Parameters
+        ----------
+        species_number: int
+            The species number to block.
+        """
+        if await self._species_exists(ctx, species_number):
+            await self._edit_guild_ids(ctx, "blocked_species",
+                    species_number, True, "Blocked Species")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="unblock_species")
+    async def unblock_species(self, ctx: commands.Context,
+            species_number:int) -> None:
+        """Lets a blocked species spawn in this server again.
+
+        Parameters
+        ----------
+        species_number: int
+            The species number to unblock.
+        """
+        await self._edit_guild_ids(ctx, "blocked_species", species_number,
+                False, "Blocked Species")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="allow_channel")
+    async def allow_channel(self, ctx: commands.Context,
+            channel:discord.TextChannel) -> None:
+        """Adds a channel to the channels whose messages spawn Digimon.
+            Once any channel is allowed, only allowed channels spawn Digimon.
+
+        Parameters
+        ----------
+        channel: discord.TextChannel
+            The channel to allow.
+        """
+        await self._edit_guild_ids(ctx, "allowed_channels", channel.id, True,
+                "Allowed Channels")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="disallow_channel")
+    async def disallow_channel(self, ctx: commands.Context,
+            channel:discord.TextChannel) -> None:
+        """Removes a channel from the allowed channels.
+
+        Parameters
+        ----------
+        channel: discord.TextChannel
+            The channel to remove.
+        """
+        await self._edit_guild_ids(ctx, "allowed_channels", channel.id, False,
+                "Allowed Channels")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="block_channel")
+    async def block_channel(self, ctx: commands.Context,
+            channel:discord.TextChannel) -> None:
+        """Stops messages in a channel from spawning Digimon.
+
+        Parameters
+        ----------
+        channel: discord.TextChannel
+            The channel to block.
+        """
+        await self._edit_guild_ids(ctx, "blocked_channels", channel.id, True,
+                "Blocked Channels")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="unblock_channel")
+    async def unblock_channel(self, ctx: commands.Context,
+            channel:discord.TextChannel) -> None:
+        """Lets messages in a blocked channel spawn Digimon again.
+
+        Parameters
+        ----------
+        channel: discord.TextChannel
+            The channel to unblock.
+        """
+        await self._edit_guild_ids(ctx, "blocked_channels", channel.id, False,
+                "Blocked Channels")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="schedule_event")
+    async def schedule_event(self, ctx: commands.Context, name:str,
+            start_in:int, duration:int, spawn_chance:int, *boosts:str)\
+            -> None:
+        """Schedules a spawn event, such as a Mega hour.
+
+        Parameters
+        ----------
+        name: str
+            Name of the event.
+        start_in: int
+            Minutes until the event starts.
+        duration: int
+            Length of the event in minutes.
+        spawn_chance: int
+            Spawn chance in percent during the event, 0 keeps the usual.
+        boosts: str
+            Weight multipliers such as Mega=10 for a stage or 25=5 for a
+            species number.
+        """
+        title = "Schedule Event: Failure"
+        if start_in < 0 or duration <= 0:
+            await self._embed_msg(ctx, title, "The event has to start now "\
+                    "or later and last at least a minute")
+            return
+        if not 0 <= spawn_chance <= 100:
+            await self._embed_msg(ctx, title, f"Spawn chance has to be "\
+                    f"[0,100], which is not {spawn_chance}")
+            return
+        stage_weights = dict()
+        species_weights = dict()
+        for boost in boosts:
+            try:
+                target, weight = boost.rsplit("=", 1)
+                weight = float(weight)
+                if weight < 0:
+                    raise ValueError(boost)
+                if target.isdigit():
+                    self.database.species_information(int(target))
+                    species_weights[str(int(target))] = weight
+                else:
+                    stage_weights[Stage.from_string(target).value] = weight
+            except (ValueError, KeyError, UnknownSpeciesNumber):
+                await self._embed_msg(ctx, title, f"Boost {boost} has to "\
+                        "look like Mega=10 or 25=5")
+                return
+        start = time.time() + start_in * 60
+        end = start + duration * 60
+        settings = await self._conf.guild(ctx.guild).all()
+        for other in settings["events"]:
+            if other["start"] < end and start < other["end"]:
+                await self._embed_msg(ctx, title, f"The event overlaps "\
+                        f"event {other['id']}: {other['name']}")
+                return
+        event = {
+            "id": max((e["id"] for e in settings["events"]), default=0) + 1,
+            "name": name,
+            "start": start,
+            "end": end,
+            "spawn_chance": spawn_chance or None,
+            "stage_weights": stage_weights,
+            "species_weights": species_weights
+        }
+        async with self._conf.guild(ctx.guild).events() as events:
+            events.append(event)
+        self._schedule_event(ctx.guild.id, event, settings)
+        LOG.info(f"In guild {ctx.guild.id} scheduled event {event}")
+        await self._embed_msg(ctx, "Schedule Event: Success",
+                f"Event {event['id']}: {name} starts "\
+                f"{_format_time(start)} and ends {_format_time(end)}")
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="list_events")
+    async def list_events(self, ctx: commands.Context) -> None:
+        """Lists the scheduled spawn events of this server."""
+        events = await self._conf.guild(ctx.guild).events()
+        if len(events) == 0:
+            await self._embed_msg(ctx, "Events", "No events are scheduled")
+            return
+        description = ""
+        for event in sorted(events, key=lambda e: e["start"]):
+            boosts = [f"{k}={v:g}" for k, v in event["stage_weights"].items()]
+            boosts += [f"#{k}={v:g}"
+                    for k, v in event["species_weights"].items()]
+            chance = event["spawn_chance"]
+            description += f"{event['id']}: {event['name']}; "\
+                    f"{_format_time(event['start'])} to "\
+                    f"{_format_time(event['end'])}; "\
+                    f"Chance: {'usual' if chance is None else f'{chance}%'}"\
+                    f"; Boosts: {', '.join(boosts) or 'none'}\n"
+        await self._embed_msg(ctx, "Events", description)
+
+
+    @commands.guild_only()
+    @commands.admin()
+    @admin.command(name="cancel_event")
+    async def cancel_event(self, ctx: commands.Context, event_id:int)\
+            -> None:
+        """Cancels a scheduled spawn event, ending it if it is running.
+
+        Parameters
+        ----------
+        event_id: int
+            The id shown by list_events.
+        """
+        events = await self._conf.guild(ctx.guild).events()
+        if not any(e["id"] == event_id for e in events):
+            await self._embed_msg(ctx, "Cancel Event: Failure",
+                    f"No event has id {event_id}")
+            return
+        await self._end_event(ctx.guild.id, event_id)
+        await self._embed_msg(ctx, "Cancel Event: Success",
+                f"Cancelled event {event_id}")
+
+
+    @checks.is_owner()
+    @admin.command(name="set_spawn_backend")
+    async def set_spawn_backend(self, ctx: commands.Context, kind:str,
+            file_path:str=None) -> None:
+        """Sets where catchable Digimon are kept. Use "sqlite" when the bot
+            runs as several processes.
+
+        Parameters
+        ----------
+        kind: str
+            Either "config" or "sqlite".
+        file_path: str
+            Location of the SQLite file shared by all processes. The default
+            is spawns.sqlite3 in the cog's data folder.
+        """
+        kind = kind.lower()
+        if kind in ("config", "sqlite"):
+            await self._conf.spawn_backend.set(kind)
+            await self._conf.spawn_backend_path.set(file_path)
+            self._set_spawn_backend(kind, file_path)
+            LOG.info(f"Set spawn backend to {kind} {file_path or ''}")
+            title = "Set Spawn Backend: Success"
+            description = f"Spawn backend set to {kind}"
+        else:
+            title = "Set Spawn Backend: Failure"
+            description = f"Spawn backend has to be config or sqlite, "\
+                    f"which is not {kind}"
+        await self._embed_msg(ctx, title, description)
+
+
+    @checks.is_owner()
+    @admin.command(name="set_catch_tolerance")
+    async def set_catch_tolerance(self, ctx: commands.Context,
+            tolerance:int) -> None:
+        """Sets how many typos a correct catch guess may have.
+
+        Parameters
+        ----------
+        tolerance: int
+            Largest edit distance between a guess and the name, from 0,
+            which requires the exact name, to 3.
+        """
+        if 0 <= tolerance <= _MAX_CATCH_TOLERANCE:
+            await self._conf.catch_tolerance.set(tolerance)
+            self._catch_tolerance = tolerance
+            LOG.info(f"Set catch tolerance to {tolerance}")
+            title = "Set Catch Tolerance: Success"
+            description = f"Catch tolerance set to {tolerance}"
+        else:
+            title = "Set Catch Tolerance: Failure"
+            description = f"Catch tolerance must be [0,"\
+                    f"{_MAX_CATCH_TOLERANCE}]"
+        await self._embed_msg(ctx, title, description)
+
+
+    @checks.is_owner()
+    @admin.command(name="set_catch_rate_limit")
+    async def set_catch_rate_limit(self, ctx: commands.Context,
+            attempts:int, window:int) -> None:
+        """Sets how many catch attempts each user may make per guild
+            within a window of seconds. Extra attempts are ignored.
+
+        Parameters
+        ----------
+        attempts: int
+            Attempts allowed per window, 0 removes the limit.
+        window: int
+            Length of the window in seconds.
+        """
+        if attempts >= 0 and window > 0:
+            await self._conf.catch_rate_limit.set(attempts)
+            await self._conf.catch_rate_window.set(window)
+            self.catch_limiter.configure(attempts, window)
+            LOG.info(f"Set catch rate limit to {attempts} per {window}s")
+            title = "Set Catch Rate Limit: Success"
+            description = f"Catch rate limit set to {attempts} attempts "\
+                    f"per {window}s"
+        else:
+            title = "Set Catch Rate Limit: Failure"
+            description = "Attempts can not be negative and the window "\
+                    "has to be positive"
+        await self._embed_msg(ctx, title, description)
+
+
+    @checks.is_owner()
+    @admin.command(name="set_cache_size")
+    async def set_cache_size(self, ctx: commands.Context, name:str,
+            size:int=None) -> None:
+        """Sets how many entries an in-memory cache keeps. The least
+            recently used are dropped first, changed ones being saved.
+
+        Parameters
+        ----------
+        name: str
+            The cache, such as user_sessions or message_rates.
+        size: int
+            Entries kept at most. The default is None, which restores
+            the default size.
+        """
+        if name not in self.caches:
+            title = "Set Cache Size: Failure"
+            description = f"No cache named {name}, choose one of "\
+                    f"{', '.join(self.caches)}"
+        elif size is not None and size < 1:
+            title = "Set Cache Size: Failure"
+            description = "The size has to be positive"
+        else:
+            async with self._conf.cache_sizes() as sizes:
+                if size is None:
+                    sizes.pop(name, None)
+                else:
+                    sizes[name] = size
+            size = _CACHE_SIZES[name] if size is None else size
+            self.caches[name].resize(size)
+            LOG.info(f"Set size of cache {name} to {size}")
+            title = "Set Cache Size: Success"
+            description = f"Cache {name} keeps up to {size} entries"
+        await self._embed_msg(ctx, title, description)
+
+
+    @checks.is_owner()
+    @admin.command(name="reload_database")
+    async def command_reload_database(self, ctx: commands.Context,
+            force:bool=False) -> None:
+        """Reloads the species database file without reloading the cog.
+
+        Parameters
+        ----------
+        force: bool
+            Reload even if species that exist now are missing from the
+            file, as long as no user owns a Digimon of one.
+            The default is False.
+        """
+        try:
+            database = await self.reload_database(force)
+        except (OSError, InvalidDatabase) as exp:
+            LOG.warning(f"Not reloading species database: {exp}")
+            await self._embed_msg(ctx, "Reload Database: Failure", str(exp))
+            return
+        await self._embed_msg(ctx, "Reload Database: Success",
+                f"Loaded {len(database.species_numbers())} species")
+
+
+    @checks.is_owner()
+    @admin.command(name="set_database_watch")
+    async def set_database_watch(self, ctx: commands.Context,
+            interval:int) -> None:
+        """Sets how often the species database file is checked for changes,
+            reloading it when it changed.
+
+        Parameters
+        ----------
+        interval: int
+            Seconds between checks, 0 stops checking.
+        """
+        if interval >= 0:
+            await self._conf.database_watch_interval.set(interval)
+            self._watch_database(interval)
+            LOG.info(f"Set database watch interval to {interval}s")
+            title = "Set Database Watch: Success"
+            description = f"Database watch interval set to {interval}s"
+        else:
+            title = "Set Database Watch: Failure"
+            description = "Database watch interval can not be negative"
+        await self._embed_msg(ctx, title, description)
+
+
+    @checks.is_owner()
+    @admin.command(name="stats")
+    async def show_stats(self, ctx: commands.Context) -> None:
+        """Shows latency and Config operation stats."""
+        if not self.stats.enabled:
+            title = "Stats: Disabled"
+            description = "Enable them with the set_stats command"
+        else:
+            title = "Stats"
+            summary = self.stats.summary()
+            if len(summary) > 1900:
+                summary = summary[:1900] + "\n..."
+            description = f"```\n{summary}\n```"
+        await self._embed_msg(ctx, title, description)
+
+
+    @checks.is_owner()
+    @admin.command(name="set_stats")
+    async def set_stats(self, ctx: commands.Context, enabled:bool) -> None:
+        """Turns recording of stats on or off. Turning them on starts
+            from zero.
+
+        Parameters
+        ----------
+        enabled: bool
+            Whether stats are recorded.
+        """
+        await self._conf.stats_enabled.set(enabled)
+        self.stats.reset()
+        self._set_stats_enabled(enabled)
+        LOG.info(f"Set stats enabled to {enabled}")
+        await self._embed_msg(ctx, "Set Stats: Success",
+                f"Stats {'enabled' if enabled else 'disabled'}")
+
+
+    @checks.is_owner()
+    @admin.command(name="set_metrics_interval")
+    async def set_metrics_interval(self, ctx: commands.Context,
+            interval:int) -> None:
+        """Sets how often the Prometheus metrics file is written to the
+            cog's data folder. Stats have to be enabled too.
+
+        Parameters
+        ----------
+        interval: int
+            Seconds between writes, 0 stops writing the file.
+        """
+        if interval >= 0:
+            await self._conf.metrics_interval.set(interval)
+            self._start_metrics_task(interval)
+            LOG.info(f"Set metrics interval to {interval}s")
+            title = "Set Metrics Interval: Success"
+            description = f"Metrics interval set to {interval}s"
+        else:
+            title = "Set Metrics Interval: Failure"
+            description = "Metrics interval can not be negative"
+        await self._embed_msg(ctx, title, description)
+
+
+    @checks.is_owner()
+    @admin.group(name="profile")
+    async def profile(self, ctx: commands.Context) -> None:
+        """Sampling profiler commands"""
+
+
+    @checks.is_owner()
+    @profile.command(name="start")
+    async def profile_start(self, ctx: commands.Context, seconds:int=60,
+            interval_ms:int=5) -> None:
+        """Starts sampling what the bot is doing. The samples are written
+            to the profiles folder of the cog's data folder when stopped.
+
+        Parameters
+        ----------
+        seconds: int
+            Seconds after which the profiler stops by itself.
+            The default is 60, at most 600.
+        interval_ms: int
+            Milliseconds between samples. The default is 5.
+        """
+        if self._profiler is not None:
+            title = "Start Profiler: Failure"
+            description = "The profiler is already running"
+        elif not 0 < seconds <= _MAX_PROFILE_SECONDS \
+                or not 0 < interval_ms <= 1000:
+            title = "Start Profiler: Failure"
+            description = f"Seconds have to be within 1 and "\
+                    f"{_MAX_PROFILE_SECONDS}, the interval within 1 and "\
+                    "1000 ms"
+        else:
+            # Imported here so the profiler costs nothing unless used
+            from .profiler import SamplingProfiler
+            self._profiler = SamplingProfiler(threading.get_ident(),
+                    interval_ms / 1000, os.path.dirname(__file__))
+            self._profiler.start()
+            self.scheduler.schedule("profile_stop", time.time() + seconds,
+                    self._stop_profiler)
+            LOG.info(f"Started profiler for {seconds}s every "\
+                    f"{interval_ms}ms")
+            title = "Start Profiler: Success"
+            description = f"Sampling every {interval_ms} ms for up to "\
+                    f"{seconds}s"
+        await self._embed_msg(ctx, title, description)
+
+
+    @checks.is_owner()
+    @profile.command(name="stop")
+    async def profile_stop(self, ctx: commands.Context) -> None:
+        """Stops the profiler and writes its samples."""
+        if self._profiler is None:
+            await self._embed_msg(ctx, "Stop Profiler: Failure",
+                    "The profiler is not running")
+            return
+        file_name, samples = await self._stop_profiler()
+        await self._embed_msg(ctx, "Stop Profiler: Success",
+                f"Wrote {samples} samples to {file_name}")
+
+
+    async def _stop_profiler(self) -> (str, int):
+        """Stops the profiler and writes its folded stacks.
+        Returns
+        -------
+        str:
+            Name of the file in the profiles folder.
+        int:
+            Number of samples taken.
+        """
+        profiler = self._profiler
+        self._profiler = None
+        self.scheduler.cancel("profile_stop")
+        profile_dir = os.path.join(cog_data_path(self), "profiles")
+        file_name = f"profile-{int(profiler.started)}.folded"
+        def finish():
+            profiler.stop()
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.write(os.path.join(profile_dir, file_name))
+        await asyncio.get_running_loop().run_in_executor(None, finish)
+        LOG.info(f"Wrote {profiler.samples} profiler samples over "\
+                f"{profiler.stopped - profiler.started:.0f}s to {file_name}")
+        return file_name, profiler.samples
+
+
+    @checks.is_owner()
+    @admin.command(name="export_collections")
+    async def export_collections(self, ctx: commands.Context) -> None:
+        """Exports every user's Digimon to a JSONL file in the exports
+            folder of the cog's data folder.
+        """
+        loop = asyncio.get_running_loop()
+        export_dir = os.path.join(cog_data_path(self), "exports")
+        await loop.run_in_executor(None, functools.partial(os.makedirs,
+                export_dir, exist_ok=True))
+        file_name = f"collections-{int(time.time())}.jsonl"
+        file_path = os.path.join(export_dir, file_name)
+        transfer = exchange.TransferStats()
+        # Config hands over every user at once, each is dropped as soon as
+        # it is encoded so only one copy of the data is ever held
+        users = await self._conf.all_users()
+        # Files are only touched in the executor, so a slow disk does not
+        # stall the event loop
+        f = await loop.run_in_executor(None, open, f"{file_path}.part", "w")
+        try:
+            chunk = [exchange.header()]
+            while users:
+                user_id, data = users.popitem()
+                try:
+                    chunk.append(exchange.encode_user(self.database,
+                        user_id, data))
+                except (UnknownSpeciesNumber, KeyError, TypeError) as exp:
+                    LOG.warning(f"Not exporting user {user_id}: {exp!r}")
+                    transfer.invalid += 1
+                    continue
+                transfer.users += 1
+                transfer.digimon += len(data["digimon"])
+                if transfer.users % _TRANSFER_YIELD_EVERY == 0:
+                    await loop.run_in_executor(None, f.write,
+                            "".join(chunk))
+                    chunk = []
+            await loop.run_in_executor(None, f.write, "".join(chunk))
+        finally:
+            await loop.run_in_executor(None, f.close)
+        await loop.run_in_executor(None, os.replace, f"{file_path}.part",
+                file_path)
+        LOG.info(f"Exported collections to {file_path}: {transfer}")
+        await self._embed_msg(ctx, "Export Collections: Success",
+                f"Exported {transfer} to {file_name}")
+
+
+    @checks.is_owner()
+    @admin.command(name="import_collections")
+    async def import_collections(self, ctx: commands.Context, file_name:str,
+            merge:bool=False) -> None:
+        """Imports users' Digimon from a JSONL file in the exports folder
+            of the cog's data folder.
+
+        Parameters
+        ----------
+        file_name: str
+            Name of the file in the exports folder.
+        merge: bool
+            Append to existing collections instead of replacing them.
+            The default is False.
+        """
+        file_path = os.path.join(cog_data_path(self), "exports",
+                os.path.basename(file_name))
+        if not os.path.isfile(file_path):
+            await self._embed_msg(ctx, "Import Collections: Failure",
+                    f"No export named {file_name}")
+            return
+        loop = asyncio.get_running_loop()
+        transfer = exchange.TransferStats()
+        line_number = 0
+        # Read in the executor a chunk of lines at a time, so a slow disk
+        # does not stall the event loop
+        f = await loop.run_in_executor(None, open, file_path)
+        try:
+            while True:
+                lines = await loop.run_in_executor(None, f.readlines,
+                        _TRANSFER_READ_SIZE)
+                if not lines:
+                    break
+                for line in lines:
+                    line_number += 1
+                    if not line.strip():
+                        continue
+                    try:
+                        user_id, collection, selected = \
+                                exchange.decode_user(self.database, line,
+                                    line_number)
+                    except exchange.InvalidRecord as exp:
+                        LOG.warning(exp)
+                        transfer.invalid += 1
+                        continue
+                    if user_id is None:
+                        continue
+                    # Queued like any other change, so a change already
+                    # queued for the user can not overwrite the import
+                    await self.user_writes.submit(user_id,
+                            functools.partial(_import_user, collection,
+                                selected, merge))
+                    transfer.users += 1
+                    transfer.digimon += len(collection)
+        finally:
+            await loop.run_in_executor(None, f.close)
+        LOG.info(f"Imported collections from {file_path}: {transfer}")
+        await self._embed_msg(ctx, "Import Collections: Success",
+                f"Imported {transfer}")
 
 
     @commands.group()
@@ -275,6 +1885,54 @@ class Digicord(commands.Cog):
         """Digimon commands"""
 
 
+    async def _user_session(self, user_id:int) -> (list, int):
+        """Returns a user's collection and selected Digimon id, reading
+            Config only if the user has no live session.
+        Parameters
+        ----------
+        user_id: int
+            The id of the user to get the session of.
+        Returns
+        -------
+        list:
+            The user's Digimon as dictionaries. Copy it before changing it.
+        int:
+            The selected Digimon id, may be None.
+        """
+        collection, selected = self.user_sessions.get(user_id, (None, None))
+        if collection is not None:
+            self.stats.count("user_session.hit")
+            return collection, selected
+        self.stats.count("user_session.miss")
+        data = await self._conf.user_from_id(user_id).all()
+        self.user_sessions.put(user_id, (data["digimon"],
+                data["selected_digimon"]))
+        return data["digimon"], data["selected_digimon"]
+
+
+    async def _read_user_state(self, user_id:int) -> dict:
+        """Returns a copy of a user's data for queued changes to modify."""
+        collection, selected = await self._user_session(user_id)
+        return {"digimon": list(collection), "selected_digimon": selected}
+
+
+    async def _write_user_state(self, user_id:int, state:dict) -> None:
+        """Writes a user's changed data in one operation, keeping it as the
+            user's session.
+        Parameters
+        ----------
+        user_id: int
+            The user's id.
+        state: dict
+            The user's Digimon and selected Digimon id.
+        """
+        self.user_sessions.invalidate(user_id)
+        await self._conf.user_from_id(user_id).set(state)
+        self.user_sessions.put(user_id, (state["digimon"],
+                state["selected_digimon"]))
+
+
+    @timed("register_digimon")
     async def register_digimon(self, user:discord.User, digi:Individual)\
             -> None:
         """Register a given Digimon to a given user.
@@ -286,9 +1944,9 @@ class Digicord(commands.Cog):
         digi: Individual
             The Individual Digimon to register
         """
-        caught_digimon = await self._conf.user(user).digimon()
-        caught_digimon.append(digi.to_dict())
-        await self._conf.user(user).digimon.set(caught_digimon)
+        def register(state):
+            state["digimon"].append(digi.to_dict())
+        await self.user_writes.submit(user.id, register)
 
     
     async def set_digimon_nickname(self, user:discord.User, digimon_id:int,
@@ -304,21 +1962,45 @@ class Digicord(commands.Cog):
         nickname: str
             The new nickname for the Digimon
         """
-        try:
-            caught_digimon = await self._conf.user(user).digimon()
-            ind = Individual.from_dict(caught_digimon[digimon_id])
+        def rename(state):
+            try:
+                ind = Individual.from_dict(state["digimon"][digimon_id])
+            except IndexError:
+                raise UnknownDigimonIdNumber(user, digimon_id)
             old_name = ind.nickname
             ind.nickname = nickname
-            caught_digimon[digimon_id] = ind.to_dict()
-            await self._conf.user(user).digimon.set(caught_digimon)
-            LOG.info(f"{user.id} changed Digimon {digimon_id} "\
-                    f"nickname from {old_name} to {nickname}")
-        except IndexError:
-            raise UnknownDigimonIdNumber(user, digimon_id)
+            state["digimon"][digimon_id] = ind.to_dict()
+            return old_name
+        old_name = await self.user_writes.submit(user.id, rename)
+        LOG.info(f"{user.id} changed Digimon {digimon_id} "\
+                f"nickname from {old_name} to {nickname}")
+
+
+    async def select_digimon(self, user:discord.User, digimon_id:int)\
+            -> None:
+        """Selects a Digimon of the given user.
+
+        Parameters
+        ----------
+        user: discord.User
+            The user to select a Digimon for.
+        digimon_id: int
+            The id of the Digimon to select.
+        Raises
+        ------
+        UnknownDigimonIdNumber
+            Indicates the user has no Digimon with that id.
+        """
+        def select(state):
+            if not 0 <= digimon_id < len(state["digimon"]):
+                raise UnknownDigimonIdNumber(user, digimon_id)
+            state["selected_digimon"] = digimon_id
+        await self.user_writes.submit(user.id, select)
 
 
     async def delete_digimon(self, user:discord.User, digimon_id:int) -> None:
-        """Deletes the given Digimon from the given user.
+        """Deletes the given Digimon from the given user, clearing the
+        selection if it was selected.
         
         Parameters
         ----------
@@ -335,12 +2017,61 @@ class Digicord(commands.Cog):
            will be passed user input. Users of this function
            beware.
         """
-        caught_digimon = await self._conf.user(user).digimon()
-        try:
-            del caught_digimon[digimon_id]
-            await self._conf.user(user).digimon.set(caught_digimon)
-        except IndexError:
-            raise UnknownDigimonIdNumber(user, digimon_id)
+        def delete(state):
+            try:
+                del state["digimon"][digimon_id]
+            except IndexError:
+                raise UnknownDigimonIdNumber(user, digimon_id)
+            selected = state["selected_digimon"]
+            if selected == digimon_id:
+                state["selected_digimon"] = None
+            elif selected is not None and selected > digimon_id:
+                state["selected_digimon"] = selected - 1
+        await self.user_writes.submit(user.id, delete)
+
+
+    async def release_digimon(self, user:discord.User, digimon_ids:list,
+            expected:list) -> list:
+        """Releases several Digimon of the given user with a single write,
+            shifting the selected Digimon id past the released ones.
+
+        Parameters
+        ----------
+        user: discord.User
+            The user to release Digimon from.
+        digimon_ids: list
+            The ids of the Digimon to release, in ascending order.
+        expected: list
+            The collection the ids were chosen from. Nothing is released
+            if the collection has changed since, other than by catching.
+        Returns
+        -------
+        list:
+            The released Digimon as dictionaries, empty if nothing
+            was released.
+        """
+        def release(state):
+            caught_digimon = state["digimon"]
+            if caught_digimon[:len(expected)] != expected:
+                return []
+            released_ids = set(digimon_ids)
+            kept = []
+            released = []
+            for digimon_id, digi in enumerate(caught_digimon):
+                if digimon_id in released_ids:
+                    released.append(digi)
+                else:
+                    kept.append(digi)
+            selected = state["selected_digimon"]
+            if selected is not None:
+                if selected in released_ids:
+                    selected = None
+                else:
+                    selected -= sum(1 for i in digimon_ids if i < selected)
+            state["digimon"] = kept
+            state["selected_digimon"] = selected
+            return released
+        return await self.user_writes.submit(user.id, release)
 
 
     async def get_user_digimon(self, user:discord.User, digimon_id:int)\
@@ -368,7 +2099,7 @@ class Digicord(commands.Cog):
            will be passed user input. Users of this function
            beware.
         """
-        caught_digimon = await self._conf.user(user).digimon()
+        caught_digimon, _ = await self._user_session(user.id)
         try:
             ind_info = caught_digimon[digimon_id]
             ind = Individual.from_dict(ind_info)
@@ -406,11 +2137,9 @@ class Digicord(commands.Cog):
             Indicates that a user has no selected Digimon.
         """
         # Check that the User has a selected Digimon
-        selected_digimon_id = await self._conf.user(user).\
-                selected_digimon()
+        caught_digimon, selected_digimon_id = await self._user_session(user.id)
         if selected_digimon_id is None:
             # Check that they have Digimon
-            caught_digimon = await self._conf.user(user).digimon()
             if len(caught_digimon) == 0:
                 if msg is not None:
                     # They have no Digimon
@@ -435,34 +2164,52 @@ class Digicord(commands.Cog):
 
 
     @commands.command(name="catch")
-    async def catch(self, ctx: commands.Context, guess: str) -> None:
+    async def catch(self, ctx: commands.Context, *, guess: str) -> None:
         """Attempt to catch a Digimon via guessing it's name.
+            Case, spaces, punctuation and small typos are forgiven.
         
         Parameters
         ----------
         guess: str
             The guessed name.
         """
-        cur = await self._conf.guild(ctx.guild).current_digimon()
-        if cur is None:
+        if not self.catch_limiter.allow((ctx.guild.id, ctx.author.id)):
+            return
+        # Guesses near no species at all never need the spawn state
+        matches = self.database.match_name(guess,
+                self._catch_tolerance + _CATCH_HINT_MARGIN)
+        if not matches:
+            return
+        current = await self.spawn_state.current(ctx.guild.id)
+        if current is None:
             # There is no current digimon to be caught
             return
-        # Execute to get the current digimon
-        cur = Individual.from_dict(cur)
-        guess = guess.lower()
-        real_name = self.database.species_information(cur.species_number).name\
-                .lower()
-        if guess == real_name:
-            await self.register_digimon(ctx.author, cur)
-            await self._conf.guild(ctx.guild).current_digimon.set(None)
-            LOG.info(f"User {ctx.author.id} in guild {ctx.guild.id} "\
-                    f"caught Digimon: \"{cur.to_dict()}\"")
-            await self._embed_msg(
-                    ctx=ctx,
-                    title=f"Congratulations!",
-                    description=f"{ctx.author.mention} caught a level"\
-                            f" {cur.level} {real_name.capitalize()}"
-                )
+        spawn_id, cur = current
+        distance = next((d for d, number in matches
+            if number == cur.species_number), None)
+        # A guess nearer to another species is a guess of that species
+        if distance is None or distance > matches[0][0]:
+            return
+        if distance > self._catch_tolerance:
+            self.stats.count("catch.hint")
+            await self._embed_msg(ctx, "Close!",
+                    f"{ctx.author.mention}: That is almost its name")
+            return
+        # Only one guess wins, even across bot processes
+        if not await self.spawn_state.claim(ctx.guild.id, spawn_id):
+            self.stats.count("catch.lost_race")
+            return
+        real_name = self.database.species_information(cur.species_number)\
+                .name
+        await self.register_digimon(ctx.author, cur)
+        LOG.info(f"User {ctx.author.id} in guild {ctx.guild.id} "\
+                f"caught Digimon: \"{cur.to_dict()}\"")
+        await self._embed_msg(
+                ctx=ctx,
+                title=f"Congratulations!",
+                description=f"{ctx.author.mention} caught a level"\
+                        f" {cur.level} {real_name}"
+            )
 
 
     @digimon.command(name="select")
@@ -476,7 +2223,7 @@ class Digicord(commands.Cog):
         """
         try:
             ind, spec = await self.get_user_digimon(ctx.author, digimon_id)
-            await self._conf.user(ctx.author).selected_digimon.set(digimon_id)
+            await self.select_digimon(ctx.author, digimon_id)
             LOG.info(f"{ctx.author.id} selected {digimon_id}")
             title="Selection Successful"
             description=f"{ctx.author.mention}: Selected "\
@@ -531,7 +2278,7 @@ class Digicord(commands.Cog):
         """
         max_on_page = 10
         # Check that they have Digimon
-        caught_digimon = await self._conf.user(ctx.author).digimon()
+        caught_digimon, _ = await self._user_session(ctx.author.id)
         if len(caught_digimon) == 0:
             # They have no Digimon
             title = "Not Applicable"
@@ -559,12 +2306,18 @@ class Digicord(commands.Cog):
         # Assembly information
         title = f"Owned Digimon: Page {page_number}"
         description = ""
+        species_numbers = []
         for digi_id in digimon_ids_to_display:
             ind, spec = await self.get_user_digimon(ctx.author, digi_id)
             description += f"{digi_id}: {ind.nickname}({spec.name}); "\
                     f"Level: {ind.level}\n"
+            species_numbers.append(spec.species_number)
         description += f"Page {page_number} of {maximum_page_number}"
-        await self._embed_msg(ctx, title, description)
+        # One image of the page's sprites, in the same order as the list
+        grid = await self.sprite_grid.render(tuple(species_numbers))
+        await self._embed_msg(ctx, title, description,
+                image_file=discord.File(io.BytesIO(grid),
+                    filename="page.png"))
 
 
     @digimon.command(name="delete")
@@ -579,12 +2332,12 @@ class Digicord(commands.Cog):
             info = await ctx.maybe_send_embed(f"{ctx.author.mention} "\
                     "Confirm Deletion")
 
-            start_adding_reactions(info, ReactionPredicate.YES_OR_NO_EMOJIS)
-            pred = ReactionPredicate.yes_or_no(info, ctx.author)
-            await ctx.bot.wait_for("reaction_add", check=pred)
+            start_adding_reactions(info, (YES_EMOJI, NO_EMOJI))
+            confirmed = await self.confirmations.confirm(info.id,
+                    ctx.author.id)
 
             # If user said no
-            if not pred.result:
+            if not confirmed:
                 with contextlib.suppress(discord.HTTPException):
                     await info.delete()
                 await self._embed_msg(ctx, title="",
@@ -592,7 +2345,6 @@ class Digicord(commands.Cog):
                 return
             # Delete the digimon
             await self.delete_digimon(ctx.author, selected_digimon_id)
-            await self._conf.user(ctx.author).selected_digimon.set(None)
             LOG.info(f"{ctx.author.id} deleted {selected_digimon_id}: "\
                     f"{ind.to_dict()}")
             title="Deletion Successful"
@@ -609,6 +2361,65 @@ class Digicord(commands.Cog):
             LOG.info(exp)
     
 
+    @digimon.command(name="release")
+    async def release(self, ctx: commands.Context, *terms:str) -> None:
+        """Releases every Digimon matching all of the given terms.
+            Terms are level<N, level<=N, level=N, level>=N, level>N,
+            species=<number or name>, stage=<stage> and duplicates,
+            which keeps the highest level Digimon of each species.
+
+        Parameters
+        ----------
+        terms: str
+            The filter terms, such as level<10 duplicates.
+        """
+        try:
+            digimon_filter = CollectionFilter(self.database, terms)
+        except InvalidFilter as exp:
+            await self._embed_msg(ctx, "Release Failed",
+                    f"{ctx.author.mention}: {exp}")
+            return
+        caught_digimon, _ = await self._user_session(ctx.author.id)
+        digimon_ids = digimon_filter.select(caught_digimon)
+        if not digimon_ids:
+            await self._embed_msg(ctx, "Release: Nothing to Release",
+                    f"{ctx.author.mention}: No Digimon match "\
+                            f"{' '.join(terms)}")
+            return
+
+        # Ask for user confirmation once for the whole batch
+        description = ""
+        for digi_id in digimon_ids[:_RELEASE_PREVIEW]:
+            ind = Individual.from_dict(caught_digimon[digi_id])
+            spec = self.database.species_information(ind.species_number)
+            description += f"{digi_id}: {ind.nickname}({spec.name}); "\
+                    f"Level: {ind.level}\n"
+        if len(digimon_ids) > _RELEASE_PREVIEW:
+            description += f"and {len(digimon_ids) - _RELEASE_PREVIEW} more"
+        await self._embed_msg(ctx,
+                f"Release {len(digimon_ids)} Digimon?", description)
+        info = await ctx.maybe_send_embed(f"{ctx.author.mention} "\
+                "Confirm Release")
+        start_adding_reactions(info, (YES_EMOJI, NO_EMOJI))
+        if not await self.confirmations.confirm(info.id, ctx.author.id):
+            with contextlib.suppress(discord.HTTPException):
+                await info.delete()
+            await self._embed_msg(ctx, title="",
+                    description=f"{ctx.author.mention}: Release canceled")
+            return
+
+        released = await self.release_digimon(ctx.author, digimon_ids,
+                caught_digimon)
+        if not released:
+            await self._embed_msg(ctx, "Release Failed",
+                    f"{ctx.author.mention}: Your Digimon changed while "\
+                            "confirming, please try again")
+            return
+        LOG.info(f"{ctx.author.id} released {digimon_ids}")
+        await self._embed_msg(ctx, "Release Successful",
+                f"{ctx.author.mention}: Released {len(released)} Digimon")
+
+
     @digimon.command(name="set_nickname")
     async def set_nickname(self, ctx: commands.Context, nickname:str) -> None:
         """Changes the nickname of the selected Digimon.
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 """Digimon Class"""
-
 from enum import Enum
 
 class Stage(Enum):
@@ -35,6 +34,8 @@ class Stage(Enum):
 
 
 class Species:
+    __slots__ = ("name", "species_number", "_stage_enum")
+
     def __init__(self, name:str, species_number:int, stage:Stage):
         self.name = name
         self.species_number = species_number
@@ -83,6 +84,8 @@ class Species:
 
 
 class Individual:
+    __slots__ = ("species_number", "nickname", "level")
+
     def __init__(self, species_number:int, nickname:str, level:int=None):
         self.species_number = species_number
         self.nickname = nickname
@@ -117,4 +120,3 @@ class Individual:
             species_number=parameters["species_number"],
             level=parameters["level"]
         )
-
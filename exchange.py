@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Collection Export and Import"""
+import json
+import time
+
+from .database import Database, UnknownSpeciesNumber
+from .digimon import Individual
+
+
+FORMAT_NAME = "digicord-collections"
+FORMAT_VERSION = 1
+
+
+
+class InvalidRecord(Exception):
+    def __init__(self, line_number:int, reason:str):
+        self.line_number = line_number
+        self.reason = reason
+
+    def __str__(self):
+        return f"Invalid record on line {self.line_number}: {self.reason}"
+
+
+
+class TransferStats:
+    """Counts what an export or import handled and how fast"""
+    def __init__(self):
+        self.users = 0
+        self.digimon = 0
+        self.invalid = 0
+        self._start = time.perf_counter()
+
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+
+    def __str__(self):
+        elapsed = self.elapsed
+        rate = self.users / elapsed if elapsed > 0 else 0.0
+        return f"{self.users} users, {self.digimon} Digimon, "\
+                f"{self.invalid} invalid in {elapsed:.1f}s "\
+                f"({rate:.0f} users/s)"
+
+
+
+def header() -> str:
+    """Returns the first line of an export file.
+
+    Returns
+    -------
+    str:
+        JSON line naming the format and version.
+    """
+    return json.dumps({"format": FORMAT_NAME, "version": FORMAT_VERSION,
+        "exported_at": time.time()}) + "\n"
+
+
+def validate_collection(database:Database, digimon:list, selected:int)\
+        -> (list, int):
+    """Normalizes a collection and checks its species against the Database.
+
+    Parameters
+    ----------
+    database: Database
+        The known species.
+    digimon: list
+        The user's Digimon as dictionaries.
+    selected: int
+        The selected Digimon id, may be None.
+
+    Returns
+    -------
+    list:
+        The Digimon as dictionaries, passed through Individual.
+    int:
+        The selected Digimon id, None if it does not exist.
+
+    Raises
+    ------
+    UnknownSpeciesNumber
+        A Digimon has a species the Database does not know.
+    KeyError, TypeError
+        A Digimon is missing a field.
+    """
+    collection = []
+    for entry in digimon:
+        ind = Individual.from_dict(entry)
+        database.species_information(ind.species_number)
+        collection.append(ind.to_dict())
+    if not isinstance(selected, int) or not 0 <= selected < len(collection):
+        selected = None
+    return collection, selected
+
+
+def encode_user(database:Database, user_id:int, data:dict) -> str:
+    """Encodes one user's collection as a line of an export file.
+
+    Parameters
+    ----------
+    database: Database
+        The known species.
+    user_id: int
+        The user's id.
+    data: dict
+        The user's Config values.
+
+    Returns
+    -------
+    str:
+        JSON line with the user's id, Digimon and selected Digimon.
+    """
+    collection, selected = validate_collection(database,
+            data.get("digimon", []), data.get("selected_digimon"))
+    return json.dumps({"user_id": int(user_id), "digimon": collection,
+        "selected_digimon": selected}) + "\n"
+
+
+def decode_user(database:Database, line:str, line_number:int)\
+        -> (int, list, int):
+    """Decodes one line of an export file.
+
+    Parameters
+    ----------
+    database: Database
+        The known species.
+    line: str
+        The line to decode.
+    line_number: int
+        Position of the line in the file, for error messages.
+
+    Returns
+    -------
+    int:
+        The user's id, None for the header line.
+    list:
+        The user's Digimon as dictionaries.
+    int:
+        The selected Digimon id, may be None.
+
+    Raises
+    ------
+    InvalidRecord
+        The line is not a valid record.
+    """
+    try:
+        record = json.loads(line)
+        if "format" in record:
+            if record["format"] != FORMAT_NAME \
+                    or record["version"] != FORMAT_VERSION:
+                raise InvalidRecord(line_number, f"unsupported format "\
+                        f"{record['format']} {record['version']}")
+            return None, [], None
+        collection, selected = validate_collection(database,
+                record["digimon"], record.get("selected_digimon"))
+        return int(record["user_id"]), collection, selected
+    except UnknownSpeciesNumber as exp:
+        raise InvalidRecord(line_number, str(exp))
+    except (ValueError, KeyError, TypeError) as exp:
+        raise InvalidRecord(line_number, repr(exp))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Sprite Grid Class"""
+import asyncio
+import collections
+import contextlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from PIL import Image
+
+from .assets import sprite_path
+
+
+LOG = logging.getLogger("red.digicord")
+
+
+COLUMNS = 5
+CELL_SIZE = 64
+PADDING = 4
+
+
+
+class SpriteGrid:
+    """Composites the sprites of a collection page into one PNG.
+    Grids are rendered in a thread pool and kept in a memory and a disk
+    least recently used cache, keyed by the species numbers on the page
+    and the version of the sprites.
+    """
+    def __init__(self, cache_dir:str, memory_size:int=128,
+            disk_size:int=4096, version:str=""):
+        """
+        Parameters
+        ----------
+        cache_dir: str
+            Folder for the disk cache.
+        memory_size: int
+            Grids kept in memory. The default is 128.
+        disk_size: int
+            Grids kept on disk. The default is 4096.
+        version: str
+            Version of the sprites, see AssetManifest.sprite_version.
+            Grids of other versions are never shown and age out of the
+            caches. The default is "".
+        """
+        self.cache_dir = cache_dir
+        self.version = version
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._memory = collections.OrderedDict()
+        # Disk cache file names, least recently used first
+        entries = [e for e in os.scandir(cache_dir)
+                if e.name.endswith(".png")]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        self._disk = collections.OrderedDict((e.name, None) for e in entries)
+        self._disk_lock = threading.Lock()
+        # Renders in progress, so concurrent views of a page share one
+        self._pending = dict()
+
+
+    async def render(self, species_numbers:tuple) -> bytes:
+        """Returns the grid of a page, rendering it on a cache miss.
+
+        Parameters
+        ----------
+        species_numbers: tuple
+            Species of the Digimon on the page, in display order.
+
+        Returns
+        -------
+        bytes:
+            The grid as PNG.
+        """
+        key = (self.version, tuple(species_numbers))
+        png = self._memory.get(key)
+        if png is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return png
+        pending = self._pending.get(key)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(None, self._load_or_render, key)
+            self._pending[key] = pending
+            try:
+                # Shielded so a cancelled view does not fail the others
+                png = await asyncio.shield(pending)
+            finally:
+                del self._pending[key]
+            self._remember(key, png)
+            return png
+        return await asyncio.shield(pending)
+
+
+    def _remember(self, key:tuple, png:bytes) -> None:
+        self._memory[key] = png
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+
+    def _load_or_render(self, key:tuple) -> bytes:
+        """Reads a grid from the disk cache or renders and stores it.
+        Runs in the thread pool.
+        """
+        version, species_numbers = key
+        file_name = "-".join([version] + [str(n) for n in species_numbers])\
+                + ".png"
+        file_path = os.path.join(self.cache_dir, file_name)
+        try:
+            with open(file_path, "rb") as f:
+                png = f.read()
+            os.utime(file_path)
+            with self._disk_lock:
+                self._disk.pop(file_name, None)
+                self._disk[file_name] = None
+                self.disk_hits += 1
+            return png
+        except FileNotFoundError:
+            pass
+        png = _render_grid(species_numbers)
+        with self._disk_lock:
+            self.renders += 1
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir,
+                    suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(png)
+            os.replace(tmp_path, file_path)
+            with self._disk_lock:
+                self._disk.pop(file_name, None)
+                self._disk[file_name] = None
+                evicted = []
+                while len(self._disk) > self.disk_size:
+                    evicted.append(self._disk.popitem(last=False)[0])
+            for old_name in evicted:
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.cache_dir, old_name))
+        except OSError as exp:
+            LOG.warning(f"Could not cache sprite grid {file_name}: {exp}")
+        return png
+
+
+
+def _render_grid(species_numbers:tuple) -> bytes:
+    """Pastes the sprites into a transparent grid, scaled without
+    smoothing to keep the pixel art sharp.
+
+    Parameters
+    ----------
+    species_numbers: tuple
+        Species of the sprites, filled row by row.
+
+    Returns
+    -------
+    bytes:
+        The grid as PNG.
+    """
+    columns = min(COLUMNS, max(1, len(species_numbers)))
+    rows = -(-len(species_numbers) // columns)
+    step = CELL_SIZE + PADDING
+    grid = Image.new("RGBA", (columns * step - PADDING,
+        max(1, rows) * step - PADDING))
+    for i, number in enumerate(species_numbers):
+        try:
+            with Image.open(sprite_path(number)) as sprite:
+                sprite = sprite.convert("RGBA").resize(
+                        (CELL_SIZE, CELL_SIZE), Image.NEAREST)
+        except OSError:
+            LOG.warning(f"Missing sprite for species {number}")
+            continue
+        row, column = divmod(i, columns)
+        grid.paste(sprite, (column * step, row * step), sprite)
+    buffer = io.BytesIO()
+    grid.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
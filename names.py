@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Name Matching Functions"""
+import unicodedata
+
+
+
+def normalize_name(name:str) -> str:
+    """Reduces a name to the letters and digits users are expected to type.
+
+    Parameters
+    ----------
+    name: str
+        A species name or a guess of one.
+
+    Returns
+    -------
+    str:
+        The name without case, diacritics, spaces or punctuation,
+        so "Gabumon (Blk)" becomes "gabumonblk".
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(c for c in decomposed.casefold() if c.isalnum())
+
+
+def edit_distance(a:str, b:str) -> int:
+    """Returns the Levenshtein distance between two strings.
+
+    Parameters
+    ----------
+    a: str
+        The first string.
+    b: str
+        The second string.
+
+    Returns
+    -------
+    int:
+        The fewest insertions, deletions and substitutions turning a into b.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+
+class BKTree:
+    """Burkhard-Keller tree of strings under edit distance.
+    A search only descends into children whose distance to their parent
+    could hold a match, so it visits a fraction of the strings.
+    """
+    def __init__(self):
+        # Nodes are [word, values, {distance: child}]
+        self._root = None
+        self._size = 0
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    def add(self, word:str, value) -> None:
+        """Adds a value under a word.
+
+        Parameters
+        ----------
+        word: str
+            The key, usually a normalized name.
+        value: object
+            What a search for the word returns. A word can hold several.
+        """
+        self._size += 1
+        if self._root is None:
+            self._root = [word, [value], {}]
+            return
+        node = self._root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [word, [value], {}]
+                return
+            node = child
+
+
+    def search(self, word:str, max_distance:int) -> list:
+        """Finds the values whose word is within a distance.
+
+        Parameters
+        ----------
+        word: str
+            The word to look up.
+        max_distance: int
+            The largest edit distance that matches.
+
+        Returns
+        -------
+        list:
+            (distance, value) tuples, nearest first.
+        """
+        matches = []
+        if self._root is None:
+            return matches
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = edit_distance(word, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, value) for value in node[1])
+            low = distance - max_distance
+            high = distance + max_distance
+            stack.extend(child for d, child in node[2].items()
+                    if low <= d <= high)
+        matches.sort(key=lambda match: match[0])
+        return matches
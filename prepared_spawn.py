@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Prepared Spawn Class"""
+import asyncio
+import collections
+import io
+import discord
+
+from .assets import field_path, sprite_path
+from .database import Database
+from .digimon import Individual
+from .spawn_table import SpawnTable
+
+
+# Species whose images are kept in memory, about 20 KiB each. The whole
+# database fits, so after warming up spawns never wait on the disk
+IMAGE_CACHE_SIZE = 512
+# species number -> (field image, sprite), least recently used first
+_images = collections.OrderedDict()
+
+
+
+def read_images(species_number:int) -> (bytes, bytes):
+    """Reads the field image and sprite of a species from disk.
+
+    Parameters
+    ----------
+    species_number: int
+        The species to read the images of.
+
+    Returns
+    -------
+    bytes:
+        The field image.
+    bytes:
+        The sprite.
+    """
+    with open(field_path(species_number), "rb") as f:
+        field_image = f.read()
+    with open(sprite_path(species_number), "rb") as f:
+        sprite_image = f.read()
+    return field_image, sprite_image
+
+
+async def load_images(species_number:int) -> (bytes, bytes):
+    """Returns the images of a species, reading them in the thread pool
+    unless they are already in memory. Guilds spawning the same species
+    share the same bytes.
+
+    Parameters
+    ----------
+    species_number: int
+        The species to load the images of.
+
+    Returns
+    -------
+    bytes:
+        The field image.
+    bytes:
+        The sprite.
+    """
+    images = _images.get(species_number)
+    if images is not None:
+        _images.move_to_end(species_number)
+        return images
+    loop = asyncio.get_running_loop()
+    images = await loop.run_in_executor(None, read_images, species_number)
+    _images[species_number] = images
+    while len(_images) > IMAGE_CACHE_SIZE:
+        _images.popitem(last=False)
+    return images
+
+
+async def preload_images(species_numbers:list) -> None:
+    """Reads the images of several species into memory in one go.
+
+    Parameters
+    ----------
+    species_numbers: list
+        The species to load, most recently used last.
+    """
+    missing = [n for n in species_numbers if n not in _images]
+    loop = asyncio.get_running_loop()
+    read = await loop.run_in_executor(None,
+            lambda: [read_images(n) for n in missing])
+    for species_number, images in zip(missing, read):
+        _images[species_number] = images
+    while len(_images) > IMAGE_CACHE_SIZE:
+        _images.popitem(last=False)
+
+
+def cached_species() -> list:
+    """Returns the species whose images are in memory, most recently used
+    last.
+    """
+    return list(_images)
+
+
+
+
+class PreparedSpawn:
+    """A guild's next spawn, rolled and loaded ahead of time so spawning
+    only has to send it.
+    """
+    __slots__ = ("table", "individual", "embed", "field_image",
+            "sprite_image")
+
+    def __init__(self, table:SpawnTable, individual:Individual,
+            field_image:bytes, sprite_image:bytes):
+        """
+        Parameters
+        ----------
+        table: SpawnTable
+            The spawn table the species was drawn from. The prepared spawn
+            is only valid while the guild still uses this table.
+        individual: Individual
+            The Digimon to spawn.
+        field_image: bytes
+            The field image of its species.
+        sprite_image: bytes
+            The sprite of its species.
+        """
+        self.table = table
+        self.individual = individual
+        self.field_image = field_image
+        self.sprite_image = sprite_image
+        number = individual.species_number
+        self.embed = discord.Embed.from_dict(dict(
+                title="A Wild Digimon has Appeared!",
+                type="rich",
+                description=""
+            ))
+        self.embed.set_thumbnail(url=f"attachment://sprite-{number:03d}.png")
+        self.embed.set_image(url=f"attachment://field-{number:03d}.png")
+
+
+    @staticmethod
+    async def prepare(table:SpawnTable, database:Database):
+        """Rolls a Digimon from a spawn table and loads its images.
+
+        Parameters
+        ----------
+        table: SpawnTable
+            The spawn table to draw the species from.
+        database: Database
+            The species information.
+
+        Returns
+        -------
+        PreparedSpawn:
+            The spawn, ready to send.
+        """
+        individual = database.random_digimon(table.draw())
+        field_image, sprite_image = await load_images(
+                individual.species_number)
+        return PreparedSpawn(table, individual, field_image, sprite_image)
+
+
+    def files(self) -> list:
+        """Returns the images as files to send with the embed.
+
+        Returns
+        -------
+        list:
+            The sprite and field image as discord.File.
+        """
+        number = self.individual.species_number
+        return [
+            discord.File(io.BytesIO(self.sprite_image),
+                filename=f"sprite-{number:03d}.png"),
+            discord.File(io.BytesIO(self.field_image),
+                filename=f"field-{number:03d}.png"),
+        ]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Sampling Profiler Class"""
+import collections
+import os
+import sys
+import threading
+import time
+
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval from a
+    background thread. The profiled thread is never traced, so it only
+    pays for the sampler holding the interpreter lock while it reads a
+    stack. Stacks are written in the folded format flamegraph tools read.
+    """
+    def __init__(self, thread_id:int, interval:float=0.005, focus:str=None):
+        """
+        Parameters
+        ----------
+        thread_id: int
+            Identifier of the thread to sample, usually the event loop's.
+        interval: float
+            Seconds between samples. The default is 0.005.
+        focus: str
+            Directory of the code of interest. Samples without a frame in
+            it are only counted, as a single "[elsewhere]" stack.
+            The default is None, which keeps every stack.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.focus = None if focus is None else os.path.abspath(focus)
+        self.samples = 0
+        self.started = None
+        self.stopped = None
+        # folded stack -> samples
+        self.stacks = collections.Counter()
+        # code object -> its name in a folded stack
+        self._names = dict()
+        self._stop = threading.Event()
+        self._thread = None
+
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+
+    def start(self) -> None:
+        """Starts sampling in a daemon thread."""
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run,
+                name="digicord-profiler", daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        """Stops sampling, waiting for the current sample to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped = time.time()
+
+
+    def write(self, file_path:str) -> None:
+        """Writes the stacks in folded format, the most sampled first.
+
+        Parameters
+        ----------
+        file_path: str
+            Path of the file to write, replaced only once complete.
+        """
+        with open(f"{file_path}.part", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(f"{file_path}.part", file_path)
+
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.stacks[self._fold(frame)] += 1
+            self.samples += 1
+            # Drop the reference so the frame's locals can be freed
+            del frame
+
+
+    def _fold(self, frame) -> str:
+        """Returns a stack as its frame names from the outermost, joined
+        by semicolons.
+        """
+        names = []
+        in_focus = self.focus is None
+        while frame is not None:
+            code = frame.f_code
+            name = self._names.get(code)
+            if name is None:
+                name = self._names[code] = f"{code.co_name} "\
+                        f"({os.path.basename(code.co_filename)}:"\
+                        f"{code.co_firstlineno})"
+            if not in_focus and code.co_filename.startswith(self.focus):
+                in_focus = True
+            names.append(name)
+            frame = frame.f_back
+        if not in_focus:
+            return "[elsewhere]"
+        return ";".join(reversed(names))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Rate Limiter Class"""
+import collections
+import time
+
+from .cache import BoundedCache
+
+
+class SlidingWindowLimiter:
+    """Allows each key a number of attempts within any window of time.
+    Everything is kept in memory, so checking costs no storage access.
+    Keys that attempted least recently are forgotten first once there are
+    too many, which at worst lets them attempt again early.
+    """
+    def __init__(self, limit:int, window:float, max_size:int=4096):
+        """
+        Parameters
+        ----------
+        limit: int
+            Attempts allowed per window, 0 allows every attempt.
+        window: float
+            Length of the window in seconds.
+        max_size: int
+            Keys remembered at most. The default is 4096.
+        """
+        self.limit = limit
+        self.window = window
+        self.allowed = 0
+        self.rejected = 0
+        # key -> times of its latest allowed attempts
+        self.attempts = BoundedCache(max_size)
+
+
+    def __len__(self) -> int:
+        return len(self.attempts)
+
+
+    def configure(self, limit:int, window:float) -> None:
+        """Changes the limit, forgetting earlier attempts.
+
+        Parameters
+        ----------
+        limit: int
+            Attempts allowed per window, 0 allows every attempt.
+        window: float
+            Length of the window in seconds.
+        """
+        self.limit = limit
+        self.window = window
+        self.attempts.clear()
+
+
+    def allow(self, key) -> bool:
+        """Records an attempt if the key is within its limit.
+
+        Parameters
+        ----------
+        key: hashable
+            Who is attempting, such as a guild and user id pair.
+
+        Returns
+        -------
+        bool:
+            True if the attempt is allowed, False if it is rejected.
+        """
+        if self.limit <= 0:
+            return True
+        now = time.monotonic()
+        attempts = self.attempts.get(key)
+        if attempts is None:
+            attempts = collections.deque(maxlen=self.limit)
+            self.attempts.put(key, attempts)
+        elif len(attempts) == self.limit \
+                and now - attempts[0] < self.window:
+            self.rejected += 1
+            return False
+        attempts.append(now)
+        self.allowed += 1
+        return True
+
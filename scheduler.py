@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Scheduler Class"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+
+LOG = logging.getLogger("red.digicord")
+
+
+
+class Scheduler:
+    """Runs coroutine callbacks at wall clock deadlines.
+    A single task sleeps until the earliest deadline in a heap, so the
+    background cost does not grow with the number of scheduled callbacks.
+    """
+    def __init__(self):
+        self._heap = []
+        # key -> (sequence number, callback) of the live entry
+        self._entries = dict()
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def start(self) -> None:
+        """Starts the scheduler task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+
+    def stop(self) -> None:
+        """Stops the scheduler task. Scheduled callbacks are kept."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+    def schedule(self, key, when:float, callback) -> None:
+        """Schedules a callback, replacing any other with the same key.
+
+        Parameters
+        ----------
+        key: hashable
+            Identifies the callback so it can be replaced or cancelled.
+        when: float
+            Unix time at which to run the callback.
+        callback: callable
+            Called with no arguments, returning a coroutine.
+        """
+        sequence = next(self._sequence)
+        self._entries[key] = (sequence, callback)
+        heapq.heappush(self._heap, (when, sequence, key))
+        # Only an earlier deadline changes how long the task has to sleep
+        if self._heap[0][1] == sequence:
+            self._wakeup.set()
+
+
+    def cancel(self, key) -> None:
+        """Cancels a scheduled callback. Unknown keys are ignored.
+
+        Parameters
+        ----------
+        key: hashable
+            The key the callback was scheduled with.
+        """
+        # The heap entry is skipped once it surfaces
+        self._entries.pop(key, None)
+
+
+    async def _run(self) -> None:
+        while True:
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            when, sequence, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != sequence:
+                # Cancelled or replaced
+                heapq.heappop(self._heap)
+                continue
+            delay = when - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            del self._entries[key]
+            asyncio.create_task(self._fire(key, entry[1]))
+
+
+    async def _fire(self, key, callback) -> None:
+        try:
+            await callback()
+        except Exception:
+            LOG.exception(f"Scheduled callback {key} failed")
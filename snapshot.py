@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Warm State Snapshot Functions"""
+import hashlib
+import logging
+import os
+import pickle
+import time
+
+from .assets import MANIFEST_FILE
+
+
+LOG = logging.getLogger("red.digicord")
+
+# Changed whenever the layout of the snapshot changes
+SNAPSHOT_VERSION = 1
+# Seconds after which a snapshot is too old to restore
+MAX_AGE = 600
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+
+class WarmState:
+    """What the cog had cached when it was unloaded.
+    Compiled objects are only restored by the same code that pickled them,
+    everything else is plain data.
+    """
+    def __init__(self, saved:float=None):
+        """
+        Parameters
+        ----------
+        saved: float
+            Unix time the state was taken. The default is now.
+        """
+        self.saved = time.time() if saved is None else saved
+        # Species database, with the species excluded for broken images
+        self.database = None
+        # Whether every image was found to match the asset manifest
+        self.assets_verified = False
+        # guild id -> SpawnTable, only for guilds without a running event
+        self.spawn_tables = dict()
+        # guild id -> MessageRate as a dictionary
+        self.message_rates = dict()
+        # guild id -> the Digimon of its prepared spawn as a dictionary
+        self.prepared_spawns = dict()
+        # Species whose images were held in memory
+        self.image_species = list()
+
+
+
+def code_fingerprint() -> str:
+    """Returns a digest of the cog's source files, which changes with any
+    deploy so objects pickled by other code are never restored.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(PACKAGE_DIR)):
+        if name.endswith(".py"):
+            st = os.stat(os.path.join(PACKAGE_DIR, name))
+            digest.update(f"{name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def save(file_path:str, state:WarmState) -> None:
+    """Writes a snapshot, replacing the previous one only once complete.
+
+    Parameters
+    ----------
+    file_path: str
+        Location of the snapshot.
+    state: WarmState
+        The state to save.
+    """
+    objects = pickle.dumps({
+        "database": state.database,
+        "spawn_tables": state.spawn_tables,
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "saved": state.saved,
+        "code": code_fingerprint(),
+        "objects": objects,
+        "assets_verified": state.assets_verified,
+        "manifest_mtime": _mtime(MANIFEST_FILE),
+        "message_rates": state.message_rates,
+        "prepared_spawns": state.prepared_spawns,
+        "image_species": state.image_species,
+    }
+    with open(f"{file_path}.part", "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{file_path}.part", file_path)
+
+
+def load(file_path:str, max_age:float=MAX_AGE) -> WarmState:
+    """Reads and removes a snapshot, so it is restored at most once.
+    Parts that no longer match the code or the species database on disk
+    are left out.
+
+    Parameters
+    ----------
+    file_path: str
+        Location of the snapshot.
+    max_age: float
+        Seconds after which the snapshot is ignored. The default is 600.
+
+    Returns
+    -------
+    WarmState:
+        The restorable state, None if there is no usable snapshot.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as exp:
+        LOG.warning(f"Ignoring unreadable warm state {file_path}: {exp!r}")
+        return None
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    if not isinstance(snapshot, dict) \
+            or snapshot.get("version") != SNAPSHOT_VERSION:
+        LOG.warning("Ignoring warm state of another version")
+        return None
+    age = time.time() - snapshot["saved"]
+    if not 0 <= age <= max_age:
+        LOG.info(f"Ignoring warm state saved {age:.0f}s ago")
+        return None
+    state = WarmState(snapshot["saved"])
+    state.message_rates = snapshot["message_rates"]
+    state.image_species = snapshot["image_species"]
+    if snapshot["code"] != code_fingerprint():
+        LOG.info("Not restoring compiled warm state of other code")
+        return state
+    objects = pickle.loads(snapshot["objects"])
+    database = objects["database"]
+    try:
+        current = database is not None \
+                and os.stat(database.file_path).st_mtime == database.mtime
+    except OSError:
+        current = False
+    if not current:
+        LOG.info("Not restoring warm state of another species database")
+        return state
+    # Spawn tables and prepared spawns are drawn from this database
+    state.database = database
+    state.assets_verified = snapshot["assets_verified"] \
+            and snapshot["manifest_mtime"] == _mtime(MANIFEST_FILE)
+    state.spawn_tables = objects["spawn_tables"]
+    state.prepared_spawns = snapshot["prepared_spawns"]
+    return state
+
+
+def _mtime(file_path:str) -> float:
+    """Returns when a file was modified, None if it does not exist."""
+    try:
+        return os.stat(file_path).st_mtime
+    except OSError:
+        return None
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Spawn State Backend Classes"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from .digimon import Individual
+
+
+LOG = logging.getLogger("red.digicord")
+
+
+
+class SpawnStateBackend:
+    """Keeps the catchable Digimon of every guild.
+    Each spawn gets a unique id, and claim guarantees that exactly one
+    caller wins a given spawn.
+    """
+    async def spawn(self, guild_id:int, digi:Individual) -> str:
+        """Makes a Digimon catchable in a guild, replacing any other.
+
+        Parameters
+        ----------
+        guild_id: int
+            The guild the Digimon spawned in.
+        digi: Individual
+            The Digimon that spawned.
+
+        Returns
+        -------
+        str:
+            The id of this spawn.
+        """
+        raise NotImplementedError
+
+
+    async def current(self, guild_id:int) -> (str, Individual):
+        """Returns the catchable Digimon of a guild.
+
+        Parameters
+        ----------
+        guild_id: int
+            The guild to look in.
+
+        Returns
+        -------
+        str:
+            The id of the spawn.
+        Individual:
+            The catchable Digimon.
+        None is returned instead if there is no catchable Digimon.
+        """
+        raise NotImplementedError
+
+
+    async def claim(self, guild_id:int, spawn_id:str) -> bool:
+        """Atomically removes a spawn if it is still catchable.
+
+        Parameters
+        ----------
+        guild_id: int
+            The guild of the spawn.
+        spawn_id: str
+            The id returned by current.
+
+        Returns
+        -------
+        bool:
+            True for the one caller that caught the spawn, else False.
+        """
+        raise NotImplementedError
+
+
+    def close(self) -> None:
+        """Releases any resources held by the backend."""
+
+
+
+class ConfigSpawnBackend(SpawnStateBackend):
+    """Keeps spawns in the guild's current_digimon Config value.
+    Claims are serialized per guild with a lock, which is only safe while a
+    single process writes to Config.
+    """
+    def __init__(self, conf):
+        """
+        Parameters
+        ----------
+        conf: callable
+            Returns the cog's Config.
+        """
+        self._conf = conf
+        # Only guilds with a spawn or claim in progress hold a lock
+        self._locks = weakref.WeakValueDictionary()
+
+
+    def _lock(self, guild_id:int) -> asyncio.Lock:
+        lock = self._locks.get(guild_id)
+        if lock is None:
+            lock = self._locks[guild_id] = asyncio.Lock()
+        return lock
+
+
+    async def spawn(self, guild_id:int, digi:Individual) -> str:
+        spawn_id = uuid.uuid4().hex
+        entry = digi.to_dict()
+        entry["spawn_id"] = spawn_id
+        async with self._lock(guild_id):
+            await self._conf().guild_from_id(guild_id).current_digimon.set(
+                    entry)
+        return spawn_id
+
+
+    async def current(self, guild_id:int) -> (str, Individual):
+        entry = await self._conf().guild_from_id(guild_id).current_digimon()
+        if entry is None:
+            return None
+        # Spawns saved before spawn ids existed have none
+        return entry.get("spawn_id"), Individual.from_dict(entry)
+
+
+    async def claim(self, guild_id:int, spawn_id:str) -> bool:
+        async with self._lock(guild_id):
+            current_digimon = self._conf().guild_from_id(guild_id)\
+                    .current_digimon
+            entry = await current_digimon()
+            if entry is None or entry.get("spawn_id") != spawn_id:
+                return False
+            await current_digimon.set(None)
+            return True
+
+
+
+class SQLiteSpawnBackend(SpawnStateBackend):
+    """Keeps spawns in a SQLite database in WAL mode, so processes sharing
+    the file agree on a single winner per spawn.
+    All queries run on one worker thread to keep the event loop free.
+    """
+    def __init__(self, file_path:str):
+        """
+        Parameters
+        ----------
+        file_path: str
+            Location of the SQLite database, shared by all processes.
+        """
+        self.file_path = file_path
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                thread_name_prefix="digicord-spawns")
+        self._conn = None
+
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Autocommit, so every statement is its own transaction
+            self._conn = sqlite3.connect(self.file_path, timeout=10,
+                    isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS spawns ("\
+                    "guild_id INTEGER PRIMARY KEY, "\
+                    "spawn_id TEXT NOT NULL, "\
+                    "digimon TEXT NOT NULL, "\
+                    "spawned_at REAL NOT NULL)")
+        return self._conn
+
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+
+    def _spawn(self, guild_id:int, spawn_id:str, digimon:str) -> None:
+        self._connect().execute(
+                "INSERT OR REPLACE INTO spawns VALUES (?, ?, ?, ?)",
+                (guild_id, spawn_id, digimon, time.time()))
+
+
+    def _current(self, guild_id:int) -> tuple:
+        return self._connect().execute(
+                "SELECT spawn_id, digimon FROM spawns WHERE guild_id = ?",
+                (guild_id,)).fetchone()
+
+
+    def _claim(self, guild_id:int, spawn_id:str) -> bool:
+        cursor = self._connect().execute(
+                "DELETE FROM spawns WHERE guild_id = ? AND spawn_id = ?",
+                (guild_id, spawn_id))
+        return cursor.rowcount == 1
+
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+    async def spawn(self, guild_id:int, digi:Individual) -> str:
+        spawn_id = uuid.uuid4().hex
+        await self._run(self._spawn, guild_id, spawn_id,
+                json.dumps(digi.to_dict()))
+        return spawn_id
+
+
+    async def current(self, guild_id:int) -> (str, Individual):
+        row = await self._run(self._current, guild_id)
+        if row is None:
+            return None
+        return row[0], Individual.from_dict(json.loads(row[1]))
+
+
+    async def claim(self, guild_id:int, spawn_id:str) -> bool:
+        return await self._run(self._claim, guild_id, spawn_id)
+
+
+    def close(self) -> None:
+        self._executor.submit(self._close)
+        self._executor.shutdown(wait=False)
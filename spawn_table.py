@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Spawn Table Class"""
+import random
+random.seed()
+
+from .database import Database
+
+
+# Highest per message probability when targeting spawns per hour
+MAX_ADAPTIVE_CHANCE = 0.5
+
+
+class SpawnTable:
+    """The spawn settings of one guild compiled for constant-time use.
+    Species are drawn with Vose's alias method, so a draw costs the same no
+    matter how many species or weights the guild configures.
+    """
+    def __init__(self, chance:float, spawn_channel:int,
+            allowed_channels:frozenset, blocked_channels:frozenset,
+            species:list, weights:list, target_per_hour:float=None):
+        """
+        Parameters
+        ----------
+        chance: float
+            Probability that a message spawns a Digimon, from 0 to 1.
+        spawn_channel: int
+            Id of the channel Digimon spawn in, None for any channel.
+        allowed_channels: frozenset
+            Ids of the channels whose messages can spawn Digimon.
+            Empty allows every channel.
+        blocked_channels: frozenset
+            Ids of the channels whose messages never spawn Digimon.
+        species: list
+            Species numbers that can spawn.
+        weights: list
+            Relative weight of each species, all positive.
+        target_per_hour: float
+            Spawns per hour to aim for, derived from the guild's message
+            rate instead of using chance. The default is None, which
+            uses chance.
+        """
+        self.chance = chance
+        self.spawn_channel = spawn_channel
+        self.allowed_channels = allowed_channels
+        self.blocked_channels = blocked_channels
+        self.species = species
+        self.target_per_hour = target_per_hour
+        self._prob, self._alias = _build_alias(weights)
+
+
+    @classmethod
+    def compile(cls, database:Database, spawn_chance:int, settings:dict,
+            event:dict=None):
+        """Compiles the Config of a guild into a SpawnTable.
+
+        Parameters
+        ----------
+        database: Database
+            The species that exist.
+        spawn_chance: int
+            The global spawn chance in percent, used if the guild has
+            neither a spawn chance nor a target of spawns per hour.
+        settings: dict
+            All Config values of the guild.
+        event: dict
+            Optional spawn event applied on top of the guild's settings.
+            Its "spawn_chance" in percent replaces the guild's chance and
+            target unless it is None, its "stage_weights" multiply the guild's stage weights
+            and its "species_weights" multiply the weight of single species.
+
+        Returns
+        -------
+        SpawnTable:
+            The compiled table.
+        """
+        event = event or {}
+        target_per_hour = settings.get("target_spawns_per_hour")
+        if event.get("spawn_chance") is not None:
+            spawn_chance = event["spawn_chance"]
+            target_per_hour = None
+        elif settings.get("spawn_chance") is not None:
+            spawn_chance = settings["spawn_chance"]
+        stage_weights = settings.get("stage_weights", {})
+        event_stage_weights = event.get("stage_weights", {})
+        event_species_weights = event.get("species_weights", {})
+        allowed_species = set(settings.get("allowed_species", []))
+        blocked_species = set(settings.get("blocked_species", []))
+        species = []
+        weights = []
+        for spec in database.spawnable_species():
+            number = spec.species_number
+            if allowed_species and number not in allowed_species:
+                continue
+            if number in blocked_species:
+                continue
+            weight = stage_weights.get(spec.stage, 1.0)\
+                    * event_stage_weights.get(spec.stage, 1.0)\
+                    * event_species_weights.get(str(number), 1.0)
+            if weight > 0:
+                species.append(number)
+                weights.append(weight)
+        return cls(
+            chance=spawn_chance / 100,
+            spawn_channel=settings.get("spawn_channel"),
+            allowed_channels=frozenset(settings.get("allowed_channels", [])),
+            blocked_channels=frozenset(settings.get("blocked_channels", [])),
+            species=species,
+            weights=weights,
+            target_per_hour=target_per_hour
+        )
+
+
+    def allows_channel(self, channel_id:int) -> bool:
+        """Checks whether messages in a channel can spawn Digimon.
+
+        Parameters
+        ----------
+        channel_id: int
+            Id of the channel the message was sent in.
+
+        Returns
+        -------
+        bool:
+            True if the channel can spawn Digimon, else False.
+        """
+        if channel_id in self.blocked_channels:
+            return False
+        return not self.allowed_channels or channel_id in self.allowed_channels
+
+
+    def roll(self, messages_per_hour:float=None) -> bool:
+        """Rolls whether a message spawns a Digimon.
+
+        Parameters
+        ----------
+        messages_per_hour: float
+            The guild's current message rate, needed if the table targets
+            spawns per hour.
+
+        Returns
+        -------
+        bool:
+            True if a Digimon should spawn, else False.
+        """
+        if self.target_per_hour is None:
+            chance = self.chance
+        else:
+            chance = min(MAX_ADAPTIVE_CHANCE,
+                    self.target_per_hour / messages_per_hour)
+        return bool(self.species) and random.random() < chance
+
+
+    def draw(self) -> int:
+        """Draws a species number according to the weights.
+
+        Returns
+        -------
+        int:
+            The species number, None if no species can spawn.
+        """
+        if not self.species:
+            return None
+        i = random.randrange(len(self.species))
+        if random.random() < self._prob[i]:
+            return self.species[i]
+        return self.species[self._alias[i]]
+
+
+
+def _build_alias(weights:list) -> (list, list):
+    """Builds the probability and alias columns of Vose's alias method.
+
+    Parameters
+    ----------
+    weights: list
+        Positive relative weights.
+
+    Returns
+    -------
+    list:
+        Probability of keeping each column.
+    list:
+        The column to use otherwise.
+    """
+    n = len(weights)
+    total = sum(weights)
+    prob = [w * n / total for w in weights]
+    alias = [0] * n
+    small = [i for i, p in enumerate(prob) if p < 1]
+    large = [i for i, p in enumerate(prob) if p >= 1]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        alias[s] = l
+        prob[l] -= 1 - prob[s]
+        if prob[l] < 1:
+            small.append(l)
+        else:
+            large.append(l)
+    # Whatever is left only differs from 1 by rounding
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Stats Classes"""
+import bisect
+import collections
+import functools
+import os
+import tempfile
+import time
+
+
+# Upper bounds in seconds of the latency buckets, doubling from 0.1 ms
+BUCKET_BOUNDS = tuple(0.0001 * 2**i for i in range(18))
+
+
+class Histogram:
+    """Latency histogram with fixed logarithmic buckets"""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+
+    def observe(self, seconds:float) -> None:
+        """Records one measurement.
+
+        Parameters
+        ----------
+        seconds: float
+            The measured latency.
+        """
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+
+    def quantile(self, q:float) -> float:
+        """Returns the upper bound of the bucket holding a quantile.
+
+        Parameters
+        ----------
+        q: float
+            The quantile, between 0 and 1.
+
+        Returns
+        -------
+        float:
+            Latency in seconds, infinity if it is past the last bucket.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+
+class _Timer:
+    def __init__(self, stats, name:str):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stats.observe(self._name, time.perf_counter() - self._start)
+        return False
+
+
+
+_NULL_TIMER = _NullTimer()
+
+
+
+class Stats:
+    """Latency histograms, counters and gauges of the cog.
+    Recording is skipped entirely while disabled.
+    """
+    def __init__(self, enabled:bool=False):
+        self.enabled = enabled
+        self.latency = collections.defaultdict(Histogram)
+        self.config_reads = collections.Counter()
+        self.config_writes = collections.Counter()
+        self.counters = collections.Counter()
+        self._gauges = dict()
+
+
+    def reset(self) -> None:
+        """Forgets every measurement. Gauges are kept."""
+        self.latency.clear()
+        self.config_reads.clear()
+        self.config_writes.clear()
+        self.counters.clear()
+
+
+    def observe(self, name:str, seconds:float) -> None:
+        """Records a latency.
+
+        Parameters
+        ----------
+        name: str
+            What was measured, such as a command or internal step.
+        seconds: float
+            The measured latency.
+        """
+        if self.enabled:
+            self.latency[name].observe(seconds)
+
+
+    def timer(self, name:str):
+        """Returns a context manager that records the latency of its body.
+
+        Parameters
+        ----------
+        name: str
+            What is measured.
+        """
+        if self.enabled:
+            return _Timer(self, name)
+        return _NULL_TIMER
+
+
+    def count(self, name:str, amount:int=1) -> None:
+        """Increments a counter.
+
+        Parameters
+        ----------
+        name: str
+            The counter to increment.
+        amount: int
+            How much to add. The default is 1.
+        """
+        if self.enabled:
+            self.counters[name] += amount
+
+
+    def set_gauge(self, name:str, func) -> None:
+        """Registers a gauge, which is read only when stats are reported.
+
+        Parameters
+        ----------
+        name: str
+            The gauge name.
+        func: callable
+            Returns the current value of the gauge.
+        """
+        self._gauges[name] = func
+
+
+    def gauges(self) -> dict:
+        """Returns the current value of every gauge.
+
+        Returns
+        -------
+        dict:
+            Gauge name to value.
+        """
+        return {name: func() for name, func in self._gauges.items()}
+
+
+    def summary(self) -> str:
+        """Returns a human readable report.
+
+        Returns
+        -------
+        str:
+            Latencies, Config operations, counters and gauges.
+        """
+        lines = ["Latency (count, p50, p99, mean)"]
+        for name in sorted(self.latency):
+            hist = self.latency[name]
+            lines.append(f"{name}: {hist.count}, "\
+                    f"{hist.quantile(0.50) * 1000:.1f}ms, "\
+                    f"{hist.quantile(0.99) * 1000:.1f}ms, "\
+                    f"{hist.total / hist.count * 1000:.1f}ms")
+        lines.append("Config reads")
+        for key, count in self.config_reads.most_common(10):
+            lines.append(f"{key}: {count}")
+        lines.append("Config writes")
+        for key, count in self.config_writes.most_common(10):
+            lines.append(f"{key}: {count}")
+        if self.counters:
+            lines.append("Counters")
+            for name in sorted(self.counters):
+                lines.append(f"{name}: {self.counters[name]}")
+        gauges = self.gauges()
+        if gauges:
+            lines.append("Gauges")
+            for name in sorted(gauges):
+                lines.append(f"{name}: {gauges[name]}")
+        return "\n".join(lines)
+
+
+    def prometheus(self) -> str:
+        """Returns every metric in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str:
+            The metrics, one sample per line.
+        """
+        lines = [
+            "# HELP digicord_latency_seconds Latency of commands and steps",
+            "# TYPE digicord_latency_seconds histogram",
+        ]
+        for name in sorted(self.latency):
+            hist = self.latency[name]
+            cumulative = 0
+            for bound, count in zip(BUCKET_BOUNDS, hist.counts):
+                cumulative += count
+                lines.append(f"digicord_latency_seconds_bucket"\
+                        f"{{name=\"{name}\",le=\"{bound:g}\"}} {cumulative}")
+            lines.append(f"digicord_latency_seconds_bucket"\
+                    f"{{name=\"{name}\",le=\"+Inf\"}} {hist.count}")
+            lines.append(f"digicord_latency_seconds_sum{{name=\"{name}\"}} "\
+                    f"{hist.total}")
+            lines.append(f"digicord_latency_seconds_count"\
+                    f"{{name=\"{name}\"}} {hist.count}")
+        lines.append("# HELP digicord_config_operations_total "\
+                "Config reads and writes by key")
+        lines.append("# TYPE digicord_config_operations_total counter")
+        for op, counter in (("read", self.config_reads),
+                ("write", self.config_writes)):
+            for key in sorted(counter):
+                lines.append(f"digicord_config_operations_total"\
+                        f"{{op=\"{op}\",key=\"{key}\"}} {counter[key]}")
+        lines.append("# TYPE digicord_events_total counter")
+        for name in sorted(self.counters):
+            lines.append(f"digicord_events_total{{name=\"{name}\"}} "\
+                    f"{self.counters[name]}")
+        lines.append("# TYPE digicord_gauge gauge")
+        for name, value in sorted(self.gauges().items()):
+            lines.append(f"digicord_gauge{{name=\"{name}\"}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+    def write_prometheus(self, file_path:str) -> None:
+        """Atomically writes the Prometheus text file.
+
+        Parameters
+        ----------
+        file_path: str
+            Where to write the metrics.
+        """
+        text = self.prometheus()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path),
+                suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+
+def timed(name:str):
+    """Decorates a coroutine method of the cog to record its latency.
+
+    Parameters
+    ----------
+    name: str
+        The name the latency is recorded under.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            if not self.stats.enabled:
+                return await func(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                self.stats.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+
+class InstrumentedConfig:
+    """Wraps a Config and counts reads and writes by key.
+    Only installed while stats are enabled, so disabled stats cost nothing.
+    """
+    _SCOPES = ("guild", "user", "member", "channel", "role",
+            "guild_from_id", "user_from_id", "member_from_ids",
+            "channel_from_id", "role_from_id")
+
+    def __init__(self, config, stats:Stats):
+        self._config = config
+        self._stats = stats
+
+    def __getattr__(self, name:str):
+        attr = getattr(self._config, name)
+        if name in self._SCOPES:
+            scope = name.split("_")[0]
+            @functools.wraps(attr)
+            def scoped(*args, **kwargs):
+                return _InstrumentedGroup(attr(*args, **kwargs), self._stats,
+                        scope)
+            return scoped
+        if name == "all" or name.startswith("all_"):
+            return _counted(attr, self._stats.config_reads, name)
+        if hasattr(type(self._config), name):
+            return attr
+        return _InstrumentedValue(attr, self._stats, f"global.{name}")
+
+
+
+class _InstrumentedGroup:
+    def __init__(self, group, stats:Stats, key:str):
+        self._group = group
+        self._stats = stats
+        self._key = key
+
+    def __getattr__(self, name:str):
+        attr = getattr(self._group, name)
+        if name == "all":
+            return _counted(attr, self._stats.config_reads, f"{self._key}.all")
+        if name in ("set", "clear"):
+            return _counted(attr, self._stats.config_writes,
+                    f"{self._key}.all")
+        if name == "get_attr":
+            return lambda item: _InstrumentedValue(attr(item), self._stats,
+                    f"{self._key}.{item}")
+        if hasattr(type(self._group), name):
+            return attr
+        return _InstrumentedValue(attr, self._stats, f"{self._key}.{name}")
+
+
+
+class _InstrumentedValue:
+    def __init__(self, value, stats:Stats, key:str):
+        self._value = value
+        self._stats = stats
+        self._key = key
+
+    def __call__(self, *args, **kwargs):
+        self._stats.config_reads[self._key] += 1
+        return _InstrumentedContext(self._value(*args, **kwargs),
+                self._stats, self._key)
+
+    def __getattr__(self, name:str):
+        attr = getattr(self._value, name)
+        if name in ("set", "clear"):
+            return _counted(attr, self._stats.config_writes, self._key)
+        return attr
+
+
+
+class _InstrumentedContext:
+    """Awaitable, or an async context manager whose exit writes the value
+    back, which is counted as a write.
+    """
+    def __init__(self, context, stats:Stats, key:str):
+        self._context = context
+        self._stats = stats
+        self._key = key
+
+    def __await__(self):
+        return self._context.__await__()
+
+    async def __aenter__(self):
+        return await self._context.__aenter__()
+
+    async def __aexit__(self, *exc_info):
+        self._stats.config_writes[self._key] += 1
+        return await self._context.__aexit__(*exc_info)
+
+
+
+def _counted(func, counter:collections.Counter, key:str):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        counter[key] += 1
+        return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,578 @@
+import argparse
+import asyncio
+import collections
+import copy
+import importlib
+import itertools
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import discord
+
+
+LOG = logging.getLogger('red.digicord.benchmark')
+logging.basicConfig(level=logging.INFO)
+# The cog is a package named after the repository directory
+FILE_DIR    = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR    = os.path.dirname(FILE_DIR)
+sys.path.insert(0, os.path.dirname(ROOT_DIR))
+COG_PACKAGE = os.path.basename(ROOT_DIR)
+IDS         = itertools.count(10**17)
+
+
+class MemoryConfig:
+    """In-memory stand-in for redbot.core.Config that counts operations.
+    Values are deep copied on every read and write like Red's drivers do.
+    """
+    def __init__(self, io_delay_ms:float=0.0):
+        self.io_delay   = io_delay_ms / 1000
+        self.reads      = collections.Counter()
+        self.writes     = collections.Counter()
+        self._defaults  = {'GLOBAL': {}, 'GUILD': {}, 'USER': {}}
+        self._data      = {'GLOBAL': {None: {}}, 'GUILD': {}, 'USER': {}}
+
+    def register_global(self, **defaults):
+        self._defaults['GLOBAL'].update(defaults)
+
+    def register_guild(self, **defaults):
+        self._defaults['GUILD'].update(defaults)
+
+    def register_user(self, **defaults):
+        self._defaults['USER'].update(defaults)
+
+    def guild(self, guild:discord.Guild):
+        return MemoryGroup(self, 'GUILD', guild.id)
+
+    def guild_from_id(self, guild_id:int):
+        return MemoryGroup(self, 'GUILD', guild_id)
+
+    def user(self, user:discord.User):
+        return MemoryGroup(self, 'USER', user.id)
+
+    def user_from_id(self, user_id:int):
+        return MemoryGroup(self, 'USER', user_id)
+
+    def all(self):
+        return MemoryGroup(self, 'GLOBAL', None).all()
+
+    def __getattr__(self, name:str):
+        if (name.startswith('_')):
+            raise AttributeError(name)
+        return MemoryValue(self, 'GLOBAL', None, name)
+
+    async def all_guilds(self) -> dict:
+        return await self._all_of('GUILD')
+
+    async def all_users(self) -> dict:
+        return await self._all_of('USER')
+
+    async def _all_of(self, category:str) -> dict:
+        await self._io('read', f'all_{category.lower()}s')
+        return {key: self.peek_all(category, key)
+                for key in self._data[category]}
+
+    async def _io(self, kind:str, name:str):
+        (self.reads if kind == 'read' else self.writes)[name] += 1
+        if (self.io_delay):
+            await asyncio.sleep(self.io_delay)
+
+    def peek(self, category:str, key:int, name:str):
+        """Read a value without counting it as a Config operation"""
+        data = self._data[category].get(key, {})
+        if (name in data):
+            return copy.deepcopy(data[name])
+        return copy.deepcopy(self._defaults[category][name])
+
+    def peek_all(self, category:str, key:int) -> dict:
+        """Read a whole scope without counting it as a Config operation"""
+        merged = copy.deepcopy(self._defaults[category])
+        merged.update(copy.deepcopy(self._data[category].get(key, {})))
+        return merged
+
+    def poke(self, category:str, key:int, name:str, value):
+        """Write a value without counting it as a Config operation"""
+        self._data[category].setdefault(key, {})[name] = copy.deepcopy(value)
+
+    def reset_counters(self):
+        self.reads.clear()
+        self.writes.clear()
+
+
+class MemoryGroup:
+    def __init__(self, config:MemoryConfig, category:str, key:int):
+        self._config    = config
+        self._category  = category
+        self._key       = key
+
+    def __getattr__(self, name:str):
+        if (name.startswith('_')):
+            raise AttributeError(name)
+        return MemoryValue(self._config, self._category, self._key, name)
+
+    def get_attr(self, name:str):
+        return MemoryValue(self._config, self._category, self._key, name)
+
+    async def all(self) -> dict:
+        await self._config._io('read', f'{self._category.lower()}.all')
+        return self._config.peek_all(self._category, self._key)
+
+    async def set(self, value:dict):
+        await self._config._io('write', f'{self._category.lower()}.all')
+        self._config._data[self._category][self._key] = copy.deepcopy(value)
+
+    async def clear(self):
+        await self._config._io('write', f'{self._category.lower()}.all')
+        self._config._data[self._category].pop(self._key, None)
+
+
+class MemoryValue:
+    def __init__(self, config:MemoryConfig, category:str, key:int, name:str):
+        self._config    = config
+        self._category  = category
+        self._key       = key
+        self._name      = name
+
+    def __call__(self):
+        return MemoryValueContext(self)
+
+    async def get(self):
+        await self._config._io('read', self._name)
+        return self._config.peek(self._category, self._key, self._name)
+
+    async def set(self, value):
+        await self._config._io('write', self._name)
+        self._config.poke(self._category, self._key, self._name, value)
+
+    async def clear(self):
+        await self._config._io('write', self._name)
+        self._config._data[self._category].get(self._key, {}).pop(
+                self._name, None)
+
+
+class MemoryValueContext:
+    """Awaitable, or an async context manager saving the value on exit"""
+    def __init__(self, value:MemoryValue):
+        self._value = value
+
+    def __await__(self):
+        return self._value.get().__await__()
+
+    async def __aenter__(self):
+        self._raw = await self._value.get()
+        return self._raw
+
+    async def __aexit__(self, *exc_info):
+        await self._value.set(self._raw)
+
+
+class FakeGuild:
+    def __init__(self, guild_id:int):
+        self.id         = guild_id
+        self.name       = f'guild-{guild_id}'
+        self.channels   = list()
+        self.members    = list()
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content:str='', embed=None):
+        self.id         = next(IDS)
+        self.channel    = channel
+        self.guild      = channel.guild
+        self.author     = author
+        self.content    = content
+        self.embeds     = [] if embed is None else [embed]
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, guild:FakeGuild, send_delay_ms:float=0.0):
+        self.id         = next(IDS)
+        self.guild      = guild
+        self.name       = f'channel-{self.id}'
+        self.send_delay = send_delay_ms / 1000
+        self.sent       = 0
+        self.last_send  = None
+
+    async def send(self, content:str=None, embed=None, file=None,
+            files=None, **kwargs):
+        self.last_send = time.perf_counter()
+        # Close the images like discord.py does once they are uploaded
+        for f in (files or []) + ([file] if file else []):
+            f.close()
+        if (self.send_delay):
+            await asyncio.sleep(self.send_delay)
+        self.sent += 1
+        return FakeMessage(self, None, content or '', embed)
+
+
+class FakeMember(discord.Member):
+    """discord.Member, so the cog's isinstance checks pass, without state"""
+    def __init__(self, user_id:int, guild:FakeGuild):
+        self._fake_id   = user_id
+        self.guild      = guild
+
+    @property
+    def id(self) -> int:
+        return self._fake_id
+
+    @property
+    def bot(self) -> bool:
+        return False
+
+    @property
+    def roles(self) -> list:
+        return []
+
+    @property
+    def mention(self) -> str:
+        return f'<@{self._fake_id}>'
+
+
+class FakeBot:
+    def __init__(self, immunity_delay_ms:float=0.0):
+        self.immunity_delay = immunity_delay_ms / 1000
+        self.channels       = dict()
+        self.guilds         = dict()
+        self.immunity_checks = 0
+
+    def get_channel(self, channel_id:int):
+        return self.channels.get(channel_id)
+
+    def get_guild(self, guild_id:int):
+        return self.guilds.get(guild_id)
+
+    async def is_automod_immune(self, message) -> bool:
+        self.immunity_checks += 1
+        if (self.immunity_delay):
+            await asyncio.sleep(self.immunity_delay)
+        return False
+
+    async def wait_for(self, event:str, check=None, timeout:float=None):
+        raise asyncio.TimeoutError()
+
+
+class FakeContext:
+    def __init__(self, bot:FakeBot, author:FakeMember, channel:FakeChannel):
+        self.bot        = bot
+        self.author     = author
+        self.guild      = channel.guild
+        self.channel    = channel
+        self.message    = FakeMessage(channel, author)
+
+    async def send(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+    async def maybe_send_embed(self, message:str):
+        return await self.channel.send(embed=discord.Embed(
+            description=message))
+
+
+class World:
+    """Simulated guilds, channels and members around one cog instance"""
+    def __init__(self, args:argparse.Namespace):
+        self.rng        = random.Random(args.seed)
+        self.hit_rate   = args.hit_rate
+        self.collection = args.collection
+        self.config     = MemoryConfig(args.io_delay_ms)
+        self.bot        = FakeBot(args.immunity_delay_ms)
+        self.guilds     = list()
+        self.members    = list()
+        for guild_number in range(args.guilds):
+            guild = FakeGuild(next(IDS))
+            for _ in range(args.channels):
+                channel = FakeChannel(guild, args.send_delay_ms)
+                guild.channels.append(channel)
+                self.bot.channels[channel.id] = channel
+            self.guilds.append(guild)
+            self.bot.guilds[guild.id] = guild
+        # Users are spread over the guilds round robin
+        for user_number in range(args.users):
+            guild = self.guilds[user_number % len(self.guilds)]
+            member = FakeMember(next(IDS), guild)
+            guild.members.append(member)
+            self.members.append(member)
+        self.cog = None
+        self.data_path = None
+
+    async def start(self, spawn_chance:int, stats:bool=False):
+        package = importlib.import_module(COG_PACKAGE)
+        digicord = importlib.import_module(f'{package.__name__}.digicord')
+        digicord.Config = self
+        # A restarted cog gets the same data folder back
+        if (self.data_path is None):
+            self.data_path = tempfile.mkdtemp(prefix='digicord-benchmark-')
+        digicord.cog_data_path = lambda *args, **kwargs: self.data_path
+        self.config.poke('GLOBAL', None, 'spawn_chance', spawn_chance)
+        self.config.poke('GLOBAL', None, 'stats_enabled', stats)
+        self.cog = digicord.Digicord(self.bot)
+        await self.cog.initialize()
+        # Let startup work finish before measuring
+        await self.cog._verify_assets_task
+
+    def get_conf(self, *args, **kwargs) -> MemoryConfig:
+        return self.config
+
+    def random_member(self) -> FakeMember:
+        return self.rng.choice(self.members)
+
+    def random_context(self) -> FakeContext:
+        member = self.random_member()
+        channel = self.rng.choice(member.guild.channels)
+        return FakeContext(self.bot, member, channel)
+
+    def respawn(self, guild:FakeGuild):
+        """Give a guild a catchable Digimon without Config accounting"""
+        digi = self.cog.database.random_digimon()
+        self.config.poke('GUILD', guild.id, 'current_digimon', digi.to_dict())
+
+    def give_collection(self, member:FakeMember, size:int):
+        """Fill a member's collection without Config accounting"""
+        database = self.cog.database
+        collection = [database.random_digimon().to_dict()
+                for _ in range(size)]
+        self.config.poke('USER', member.id, 'digimon', collection)
+
+
+async def event_message(world:World):
+    member = world.random_member()
+    channel = world.rng.choice(member.guild.channels)
+    await world.cog.on_message(FakeMessage(channel, member, 'hello'))
+
+
+async def event_spawn(world:World):
+    guild = world.rng.choice(world.guilds)
+    await world.cog.spawn_digimon(world.rng.choice(guild.channels))
+
+
+async def event_trigger(world:World):
+    # Time until the spawn is handed to discord.py, run with a spawn chance
+    # of 100 so every message spawns
+    member = world.random_member()
+    channel = world.rng.choice(member.guild.channels)
+    await world.cog.on_message(FakeMessage(channel, member, 'hello'))
+    return channel.last_send
+
+
+async def event_catch(world:World):
+    ctx = world.random_context()
+    cur = world.config.peek('GUILD', ctx.guild.id, 'current_digimon')
+    if (cur is None):
+        world.respawn(ctx.guild)
+        cur = world.config.peek('GUILD', ctx.guild.id, 'current_digimon')
+    name = world.cog.database.species_information(
+            cur['species_number']).name
+    if (world.rng.random() >= world.hit_rate):
+        name = name[::-1]
+    await world.cog.catch.callback(world.cog, ctx, guess=name)
+
+
+async def event_burst(world:World):
+    # One user catching twice, renaming and selecting at the same time
+    member = world.random_member()
+    cog = world.cog
+    caught = [cog.database.random_digimon() for _ in range(2)]
+    await asyncio.gather(
+        cog.register_digimon(member, caught[0]),
+        cog.set_digimon_nickname(member, 0, 'burst'),
+        cog.register_digimon(member, caught[1]),
+        cog.select_digimon(member, 0),
+    )
+
+
+async def event_list(world:World):
+    ctx = world.random_context()
+    pages = max(1, -(-world.collection // 10))
+    await world.cog.list.callback(world.cog, ctx, world.rng.randint(1, pages))
+
+
+SCENARIOS = {
+    'messages': event_message,
+    'spawn':    event_spawn,
+    'trigger':  event_trigger,
+    'catch':    event_catch,
+    'list':     event_list,
+    'burst':    event_burst,
+}
+
+
+def percentile(ordered:list, fraction:float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if (not ordered):
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def drive(world:World, event, events:int, rate:float) -> (float, list):
+    """Run events through the cog, open loop at rate or back to back.
+    Latency is measured from when an event was due, so time spent queued
+    behind a slow event counts against it. It ends when the event returns,
+    or at the time it returns if it returns one.
+    Returns
+    -------
+    float:
+        Wall time of the run in seconds.
+    list:
+        Sorted per event latency in seconds.
+    """
+    latencies = list()
+
+    async def timed(due:float):
+        end = await event(world)
+        latencies.append((end or time.perf_counter()) - due)
+
+    start = time.perf_counter()
+    if (rate <= 0):
+        for _ in range(events):
+            await timed(time.perf_counter())
+    else:
+        tasks = list()
+        for i in range(events):
+            due = start + i / rate
+            delay = due - time.perf_counter()
+            if (delay > 0):
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(timed(due)))
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return elapsed, sorted(latencies)
+
+
+def report(scenario:str, world:World, events:int, elapsed:float,
+        latencies:list):
+    """Print throughput, latency percentiles and Config operations"""
+    reads = sum(world.config.reads.values())
+    writes = sum(world.config.writes.values())
+    sends = sum(c.sent for g in world.guilds for c in g.channels)
+    print(f'scenario: {scenario}  events: {events}  '
+            f'guilds: {len(world.guilds)}  users: {len(world.members)}')
+    print(f'throughput: {events / elapsed:.1f} events/s')
+    print(f'latency: p50 {percentile(latencies, 0.50) * 1000:.3f} ms  '
+            f'p99 {percentile(latencies, 0.99) * 1000:.3f} ms  '
+            f'max {latencies[-1] * 1000:.3f} ms')
+    print(f'config ops/event: {reads / events:.3f} reads  '
+            f'{writes / events:.3f} writes')
+    for kind, counter in (('read', world.config.reads),
+            ('write', world.config.writes)):
+        for name, count in counter.most_common(5):
+            print(f'  {kind:5} {name:24} {count}')
+    print(f'messages sent: {sends}  '
+            f'automod checks: {world.bot.immunity_checks}')
+
+
+async def startup(args:argparse.Namespace):
+    """Compare a cold start with a restart from the unloaded cog's state"""
+    world = World(args)
+    for start in ('cold', 'warm'):
+        if (world.cog is not None):
+            world.cog.cog_unload()
+        world.config.reset_counters()
+        begin = time.perf_counter()
+        await world.start(100)
+        started = time.perf_counter()
+        # First message in every guild, each one spawning
+        for guild in world.guilds:
+            member = world.rng.choice(guild.members)
+            await world.cog.on_message(FakeMessage(guild.channels[0], member,
+                    'hello'))
+        done = time.perf_counter()
+        reads = sum(world.config.reads.values())
+        print(f'{start}: start {(started - begin) * 1000:.1f} ms  '
+                f'first messages {(done - started) * 1000:.1f} ms  '
+                f'config reads {reads}')
+
+
+async def coalesce(args:argparse.Namespace):
+    """Check that concurrent changes of one user are written together and
+    none of them is lost
+    """
+    world = World(args)
+    await world.start(args.spawn_chance)
+    cog = world.cog
+    member = world.members[0]
+    world.give_collection(member, args.collection)
+    world.config.reset_counters()
+    caught = [cog.database.random_digimon() for _ in range(args.events)]
+    names = [f'burst-{i}' for i in range(args.collection)]
+    await asyncio.gather(
+        *(cog.register_digimon(member, digi) for digi in caught),
+        *(cog.set_digimon_nickname(member, i, name)
+            for i, name in enumerate(names)),
+        cog.select_digimon(member, args.collection - 1),
+    )
+    changes = args.events + args.collection + 1
+    writes = sum(world.config.writes.values())
+    collection = world.config.peek('USER', member.id, 'digimon')
+    print(f'changes: {changes}  config writes: {writes}')
+    assert writes * 10 <= changes, f'{writes} writes for {changes} changes'
+    assert len(collection) == args.collection + args.events, \
+            f'{len(collection)} Digimon kept'
+    assert [d['nickname'] for d in collection[:args.collection]] == names
+    assert [d['species_number'] for d in collection[args.collection:]] \
+            == [digi.species_number for digi in caught]
+    assert world.config.peek('USER', member.id, 'selected_digimon') \
+            == args.collection - 1
+    print('no change lost')
+
+
+async def main(args:argparse.Namespace):
+    world = World(args)
+    await world.start(args.spawn_chance, args.stats)
+    if (args.scenario == 'catch'):
+        for guild in world.guilds:
+            world.respawn(guild)
+    if (args.scenario in ('list', 'burst')):
+        for member in world.members:
+            world.give_collection(member, args.collection)
+    world.config.reset_counters()
+    world.bot.immunity_checks = 0
+    elapsed, latencies = await drive(world, SCENARIOS[args.scenario],
+            args.events, args.rate)
+    report(args.scenario, world, args.events, elapsed, latencies)
+    if (args.stats):
+        print(world.cog.stats.summary())
+
+
+if __name__ == '__main__':
+    """Replay synthetic traffic through the cog and report its cost
+    """
+    parser = argparse.ArgumentParser(description='Digicord load test')
+    parser.add_argument('scenario',
+            choices=sorted(SCENARIOS) + ['coalesce', 'startup'])
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--rate', type=float, default=0,
+            help='Events per second, 0 runs them back to back')
+    parser.add_argument('--guilds', type=int, default=100)
+    parser.add_argument('--channels', type=int, default=3,
+            help='Channels per guild')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--spawn-chance', type=int, default=1)
+    parser.add_argument('--hit-rate', type=float, default=0.2,
+            help='Fraction of catch guesses that are correct')
+    parser.add_argument('--collection', type=int, default=50,
+            help='Digimon per user for the list, burst and coalesce scenarios')
+    parser.add_argument('--io-delay-ms', type=float, default=0.0,
+            help='Simulated latency of each Config operation')
+    parser.add_argument('--send-delay-ms', type=float, default=0.0,
+            help='Simulated latency of each message send')
+    parser.add_argument('--immunity-delay-ms', type=float, default=0.0,
+            help='Simulated latency of each automod immunity check')
+    parser.add_argument('--stats', action='store_true',
+            help='Run with the cog\'s own stats recording enabled')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    logging.getLogger('red.digicord').setLevel(logging.WARNING)
+    if (args.scenario == 'startup'):
+        asyncio.run(startup(args))
+    elif (args.scenario == 'coalesce'):
+        asyncio.run(coalesce(args))
+    else:
+        asyncio.run(main(args))
@@ -3,6 +3,8 @@ from requests.exceptions import RequestException
 import bs4
 from bs4 import BeautifulSoup
 import logging
+import tempfile
+import textwrap
 import time
 import json
 import os
@@ -13,6 +15,9 @@ LOG = logging.getLogger('red.digicord.crawler')
 logging.basicConfig(level=logging.DEBUG)
 PROGRESS_MAN    = enlighten.get_manager()
 COURTESY_MS     = 2000 # Time in ms between HTTP GET requests
+FILE_DIR        = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_PATH = os.path.join(FILE_DIR, 'crawl_checkpoint.jsonl')
+DATABASE_PATH   = os.path.join(FILE_DIR, 'database.json')
 
 
 def simple_get(url:str) -> bytes:
@@ -201,19 +206,90 @@ def check_empty_table(table:bs4.element.Tag) -> bool:
     return table.findAll('td')[1].text == 'N/A'
 
 
-def web_crawl(base_url:str) -> list:
-    """Scrape/crawl from base_url and store info in a list
+def parse_digimon(row:list) -> dict:
+    """Parse a row of the main table and its Digimon specific page
+    Parameters
+    ----------
+    row: list
+        Contents of a row from an HTML table
+    Returns
+    -------
+    dict:
+        Digimon info, or None if the Digimon page could not be fetched
+    """
+    digimon = dict()
+    # Parse fields from row
+    digimon['name']             = parse_name(row)
+    digimon['species_number']   = parse_species_number(row)
+    digimon['stage']            = parse_stage(row)
+    digimon['sprite_url']       = parse_sprite_url(row)
+    digimon['page_url']         = parse_page_url(row)
+    # Request Digimon specific page after waiting
+    time.sleep(COURTESY_MS / 1000)
+    digimon_page                = simple_get(digimon['page_url'])
+    if (digimon_page == None):
+        LOG.error(f'Failed to GET from {digimon["page_url"]}')
+        return None
+    digimon_page                = BeautifulSoup(digimon_page, 'html.parser')
+    digimon['field_url']        = parse_field_image(digimon_page)
+    digimon['digivolutions']    = parse_digivolutions(digimon_page)
+    return digimon
+
+
+def load_checkpoint(checkpoint_path:str) -> set:
+    """Find the species_numbers already saved in a crawl checkpoint.
+    A partially written last line, left by a crash mid-write, is cut off so
+    appending can continue cleanly.
+    Parameters
+    ----------
+    checkpoint_path: str
+        File location of the JSONL checkpoint
+    Returns
+    -------
+    set:
+        species_numbers of the crawled Digimon
+    """
+    done = set()
+    if (not os.path.isfile(checkpoint_path)):
+        return done
+    good_size = 0
+    with open(checkpoint_path, 'rb') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['species_number'])
+            except (ValueError, KeyError):
+                LOG.warning(f'Dropping corrupt checkpoint line at byte '
+                        f'{good_size}')
+                break
+            good_size += len(line)
+    if (good_size != os.path.getsize(checkpoint_path)):
+        with open(checkpoint_path, 'rb+') as f:
+            f.truncate(good_size)
+    return done
+
+
+def web_crawl(base_url:str, checkpoint_path:str=CHECKPOINT_PATH) -> (int, int):
+    """Scrape/crawl from base_url and stream info into a checkpoint.
+    Every parsed Digimon is appended to the checkpoint right away, and
+    Digimon already in the checkpoint are skipped, so a crawl that was
+    interrupted resumes where it stopped.
     Parameters
     ----------
     base_url: str
         Base URL for crawling starting point
+    checkpoint_path: str, optional
+        File location of the JSONL checkpoint, default CHECKPOINT_PATH
     Returns
     -------
-    list:
-        List of dicts containing Digimon info
+    int:
+        Number of Digimon crawled in this run
+    int:
+        Number of Digimon that failed and are missing from the checkpoint
     """
     LOG.debug(f'Starting crawling at {base_url}')
-    database = []
+    done = load_checkpoint(checkpoint_path)
+    if (len(done) > 0):
+        LOG.debug(f'Resuming with {len(done)} Digimon already crawled')
     # Fetch base url content
     base_page = simple_get(base_url)
     if (base_page == None):
@@ -224,28 +300,34 @@ def web_crawl(base_url:str) -> list:
     rows            = base_page.tbody.findAll('tr')
     crawl_prog_bar  = PROGRESS_MAN.counter(total = len(rows), desc='Crawling',
             unit='pages')
-    # Iterate through rows in the main table
-    for row in rows:
-        digimon = dict()
-        row = list(row.children)
-        crawl_prog_bar.update()
-        # Parse fields from row
-        digimon['name']             = parse_name(row)
-        digimon['species_number']   = parse_species_number(row)
-        digimon['stage']            = parse_stage(row)
-        digimon['sprite_url']       = parse_sprite_url(row)
-        digimon['page_url']         = parse_page_url(row)
-        # Request Digimon specific page after waiting
-        time.sleep(COURTESY_MS / 1000)
-        digimon_page                = simple_get(digimon['page_url'])
-        if (digimon_page == None):
-            LOG.error(f'Failed to GET from {page_url}')
-            continue
-        digimon_page                = BeautifulSoup(digimon_page, 'html.parser')
-        digimon['field_url']        = parse_field_image(digimon_page)
-        digimon['digivolutions']    = parse_digivolutions(digimon_page)
-        database.append(digimon)
-    return database
+    crawled = 0
+    failed  = 0
+    with open(checkpoint_path, 'a') as checkpoint:
+        # Iterate through rows in the main table
+        for row in rows:
+            row = list(row.children)
+            crawl_prog_bar.update()
+            try:
+                if (parse_species_number(row) in done):
+                    continue
+                digimon = parse_digimon(row)
+            except Exception as e:
+                # A bad page is retried by the next run
+                try:
+                    page = parse_page_url(row)
+                except Exception:
+                    page = 'malformed row'
+                LOG.error(f'Failed to parse {page}: {e}')
+                failed += 1
+                continue
+            if (digimon == None):
+                failed += 1
+                continue
+            checkpoint.write(json.dumps(digimon) + '\n')
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            crawled += 1
+    return crawled, failed
 
 
 def get_species_number_lut(database:list) -> dict:
@@ -278,10 +360,9 @@ def fix_digivolution(digimon:dict, species_number_lut:dict):
     # Fix from field
     from_species_numbers = list()
     for name in digimon['digivolutions']['from']:
-        from_species_numbers = species_number_lut[name]
+        from_species_numbers.append(species_number_lut[name])
     digimon['digivolutions']['from'] = from_species_numbers
     # Fix to field
-    to_species_numbers = list()
     for digi in digimon['digivolutions']['to']:
         digi['species_number'] = species_number_lut[digi['name']]
         del digi['name']
@@ -301,6 +382,57 @@ def save_database(database:list, database_path:str):
         json.dump(database, f, indent=4)
 
 
+def assemble_database(checkpoint_path:str, database_path:str) -> int:
+    """Build the JSON database from a crawl checkpoint.
+    The checkpoint is read twice; only the name LUT and the line offsets
+    are kept in memory, and entries are written one at a time in
+    species_number order into a temporary file renamed over database_path.
+    Parameters
+    ----------
+    checkpoint_path: str
+        File location of the JSONL checkpoint
+    database_path: str
+        File location to save JSON file
+    Returns
+    -------
+    int:
+        Number of Digimon in the database
+    """
+    LOG.debug('Assembling database from checkpoint')
+    species_number_lut = dict()
+    offsets = dict()
+    with open(checkpoint_path, 'rb') as f:
+        offset = 0
+        for line in f:
+            digimon = json.loads(line)
+            species_number_lut[digimon['name']] = digimon['species_number']
+            # A later line for the same Digimon wins
+            offsets[digimon['species_number']] = offset
+            offset += len(line)
+    digivolve_prog_bar = PROGRESS_MAN.counter(total=len(offsets),
+            desc='Digivolutions', unit='dgm')
+    database_dir = os.path.dirname(os.path.abspath(database_path))
+    fd, tmp_path = tempfile.mkstemp(dir=database_dir, suffix='.tmp')
+    try:
+        with open(checkpoint_path, 'rb') as src, os.fdopen(fd, 'w') as dst:
+            dst.write('[')
+            for i, species_number in enumerate(sorted(offsets)):
+                src.seek(offsets[species_number])
+                digimon = json.loads(src.readline())
+                fix_digivolution(digimon, species_number_lut)
+                digivolve_prog_bar.update()
+                # Same layout as json.dump(database, f, indent=4)
+                dst.write(',\n' if i else '\n')
+                dst.write(textwrap.indent(json.dumps(digimon, indent=4),
+                    ' ' * 4))
+            dst.write('\n]' if offsets else ']')
+        os.replace(tmp_path, database_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return len(offsets)
+
+
 def load_database(database_path:str) -> list:
     """Loads database from JSON file (for testing)
     Parameters
@@ -319,20 +451,19 @@ def load_database(database_path:str) -> list:
 if __name__ == '__main__':
     """Scrape/crawl from base_url and store info into JSON file
     """
-    # Crawl for Digimon info
+    # Crawl for Digimon info, resuming from any previous checkpoint
     base_url = 'http://digidb.io/digimon-list/'
-    database = web_crawl(base_url)
-    # Correct Digivolution info from name to species_number
-    species_number_lut = get_species_number_lut(database)
-    digivolve_prog_bar = PROGRESS_MAN.counter(total=len(species_number_lut),
-            desc='Digivolutions', unit='dgm')
-    for digimon in database:
-        digivolve_prog_bar.update()
-        fix_digivolution(digimon, species_number_lut)
-    # Save database to JSON
-    database_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
-        'database.json')
-    save_database(database, database_path)
+    crawled, failed = web_crawl(base_url, CHECKPOINT_PATH)
+    LOG.debug(f'Crawled {crawled} Digimon in this run')
+    if (failed > 0):
+        # Keep the checkpoint so the next run only retries the failures
+        LOG.error(f'{failed} Digimon failed, not writing the database. '
+                'Run again to retry them')
+        PROGRESS_MAN.stop()
+        exit(1)
+    # Correct Digivolution info from name to species_number and save JSON
+    assemble_database(CHECKPOINT_PATH, DATABASE_PATH)
+    # The crawl is complete, so the next one starts from scratch
+    os.remove(CHECKPOINT_PATH)
     PROGRESS_MAN.stop()
     LOG.debug('Done crawling')
-
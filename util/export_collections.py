@@ -0,0 +1,163 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+
+
+LOG = logging.getLogger('red.digicord.export_collections')
+logging.basicConfig(level=logging.INFO)
+CONFIG_IDENTIFIER = '90210'
+PROGRESS_EVERY = 10000 # Users between progress messages
+# The cog is a package named after the repository directory
+FILE_DIR    = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR    = os.path.dirname(FILE_DIR)
+sys.path.insert(0, os.path.dirname(ROOT_DIR))
+COG_PACKAGE = os.path.basename(ROOT_DIR)
+
+
+def load_users(settings_path:str) -> (dict, dict):
+    """Load the user scope of the cog's Red JSON settings file.
+    Parameters
+    ----------
+    settings_path: str
+        The cog's settings.json, in cogs/Digicord of the bot's data folder.
+    Returns
+    -------
+    dict:
+        The whole settings.
+    dict:
+        The user scope within the settings, keyed by user id.
+    """
+    with open(settings_path) as f:
+        settings = json.load(f)
+    scope = settings.setdefault(CONFIG_IDENTIFIER, {})
+    return settings, scope.setdefault('USER', {})
+
+
+def export_collections(exchange, database, settings_path:str,
+        out_path:str):
+    """Stream every user's collection from the settings file to JSONL.
+    Users are removed from memory as soon as they are written.
+    Parameters
+    ----------
+    exchange: module
+        The cog's exchange module.
+    database: Database
+        The known species.
+    settings_path: str
+        The cog's settings.json.
+    out_path: str
+        The JSONL file to write.
+    Returns
+    -------
+    TransferStats:
+        What was exported.
+    """
+    transfer = exchange.TransferStats()
+    _, users = load_users(settings_path)
+    tmp_path = out_path + '.part'
+    with open(tmp_path, 'w') as f:
+        f.write(exchange.header())
+        while users:
+            user_id, data = users.popitem()
+            try:
+                f.write(exchange.encode_user(database, user_id, data))
+            except (exchange.UnknownSpeciesNumber, KeyError, TypeError) \
+                    as exp:
+                LOG.warning(f'Skipping user {user_id}: {exp!r}')
+                transfer.invalid += 1
+                continue
+            transfer.users += 1
+            transfer.digimon += len(data.get('digimon', []))
+            if transfer.users % PROGRESS_EVERY == 0:
+                LOG.info(transfer)
+    os.replace(tmp_path, out_path)
+    return transfer
+
+
+def import_collections(exchange, database, in_path:str, settings_path:str,
+        merge:bool):
+    """Stream collections from JSONL into the settings file.
+    Parameters
+    ----------
+    exchange: module
+        The cog's exchange module.
+    database: Database
+        The known species.
+    in_path: str
+        The JSONL file to read.
+    settings_path: str
+        The cog's settings.json, written atomically once at the end.
+    merge: bool
+        Append to existing collections instead of replacing them.
+    Returns
+    -------
+    TransferStats:
+        What was imported.
+    """
+    transfer = exchange.TransferStats()
+    settings, users = load_users(settings_path)
+    with open(in_path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                user_id, collection, selected = exchange.decode_user(
+                        database, line, line_number)
+            except exchange.InvalidRecord as exp:
+                LOG.warning(exp)
+                transfer.invalid += 1
+                continue
+            if user_id is None:
+                continue
+            user = users.setdefault(str(user_id), {})
+            if merge:
+                digimon = user.setdefault('digimon', [])
+                if user.get('selected_digimon') is None \
+                        and selected is not None:
+                    # Imported ids shift past the existing Digimon
+                    user['selected_digimon'] = len(digimon) + selected
+                digimon.extend(collection)
+            else:
+                user['digimon'] = collection
+                user['selected_digimon'] = selected
+            transfer.users += 1
+            transfer.digimon += len(collection)
+            if transfer.users % PROGRESS_EVERY == 0:
+                LOG.info(transfer)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(settings_path),
+            suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(settings, f)
+    os.replace(tmp_path, settings_path)
+    return transfer
+
+
+if __name__ == '__main__':
+    """Export or import user collections while the bot is stopped
+    """
+    parser = argparse.ArgumentParser(
+            description='Export or import Digicord user collections')
+    sub = parser.add_subparsers(dest='action', required=True)
+    export_parser = sub.add_parser('export')
+    export_parser.add_argument('settings', help='The cog\'s settings.json')
+    export_parser.add_argument('out', help='JSONL file to write')
+    import_parser = sub.add_parser('import')
+    import_parser.add_argument('input', help='JSONL file to read')
+    import_parser.add_argument('settings', help='The cog\'s settings.json')
+    import_parser.add_argument('--merge', action='store_true',
+            help='Append to existing collections instead of replacing them')
+    args = parser.parse_args()
+    package = importlib.import_module(COG_PACKAGE)
+    exchange = importlib.import_module(f'{package.__name__}.exchange')
+    database = exchange.Database()
+    if (args.action == 'export'):
+        transfer = export_collections(exchange, database, args.settings,
+                args.out)
+    else:
+        transfer = import_collections(exchange, database, args.input,
+                args.settings, args.merge)
+    LOG.info(f'Done: {transfer}')
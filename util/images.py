@@ -1,5 +1,11 @@
-import wget
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import hashlib
 import logging
+import tempfile
 import time
 import json
 import os
@@ -8,39 +14,211 @@ import enlighten
 
 LOG = logging.getLogger('red.digicord.images')
 logging.basicConfig(level=logging.DEBUG)
-COURTESY_MS = 2000 # Time in ms between requests
+COURTESY_MS = 2000 # Time in ms each worker waits between requests
+MAX_WORKERS = 4 # Number of concurrent downloads
+MANIFEST_SAVE_EVERY = 25 # Completed downloads between manifest saves
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 64 * 1024
 # Directory definitions
 FILE_DIR    = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR    = os.path.dirname(FILE_DIR)
 IMAGES_DIR  = os.path.join(ROOT_DIR, 'images')
 SPRITES_DIR = os.path.join(IMAGES_DIR, 'sprites')
 FIELD_DIR   = os.path.join(IMAGES_DIR, 'field')
+MANIFEST_PATH = os.path.join(IMAGES_DIR, 'manifest.json')
 
 
-def get_image(url:str, img_path:str) -> bool:
-    """Download image from url to img_path using wget.
+def create_session(pool_size:int=MAX_WORKERS) -> requests.Session:
+    """Create an HTTP session whose connection pool fits the workers.
     Parameters
     ----------
+    pool_size: int, optional
+        Number of connections kept alive per host, default MAX_WORKERS.
+    Returns
+    -------
+    requests.Session:
+        Session with pooled connections and retries on transient errors.
+    """
+    retries = Retry(total=3, backoff_factor=1,
+            status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=retries)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def file_digest(img_path:str) -> (int, str):
+    """Compute size and SHA-256 of a file.
+    Parameters
+    ----------
+    img_path: str
+        File to hash.
+    Returns
+    -------
+    int:
+        Size of the file in bytes.
+    str:
+        Hex SHA-256 digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(img_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def load_manifest(manifest_path:str=MANIFEST_PATH) -> dict:
+    """Load the image manifest, or an empty one if there is none.
+    Parameters
+    ----------
+    manifest_path: str, optional
+        File location of the manifest, default MANIFEST_PATH.
+    Returns
+    -------
+    dict:
+        Manifest with per species records of every image.
+    """
+    if (not os.path.isfile(manifest_path)):
+        return {'version': MANIFEST_VERSION, 'species': {}}
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if (manifest.get('version') != MANIFEST_VERSION):
+        LOG.warning(f'Ignoring manifest with version '
+                f'{manifest.get("version")}')
+        return {'version': MANIFEST_VERSION, 'species': {}}
+    return manifest
+
+
+def save_manifest(manifest:dict, manifest_path:str=MANIFEST_PATH):
+    """Atomically save the image manifest.
+    Parameters
+    ----------
+    manifest: dict
+        Manifest to save.
+    manifest_path: str, optional
+        File location of the manifest, default MANIFEST_PATH.
+    """
+    manifest_dir = os.path.dirname(manifest_path)
+    fd, tmp_path = tempfile.mkstemp(dir=manifest_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def record_is_current(record:dict, img_path:str) -> bool:
+    """Check that a file on disk is the one a manifest record describes.
+    A file whose size and modification time match the record is trusted
+    without hashing, so unchanged large trees are cheap to check.
+    Parameters
+    ----------
+    record: dict
+        Manifest record of the image, may be None.
+    img_path: str
+        File path of the image.
+    Returns
+    -------
+    bool:
+        True if the file exists and matches the record, else False.
+    """
+    if (record is None):
+        return False
+    try:
+        st = os.stat(img_path)
+    except OSError:
+        return False
+    if (st.st_size != record['size']):
+        return False
+    if (st.st_mtime_ns == record.get('mtime_ns')):
+        return True
+    return file_digest(img_path) == (record['size'], record['sha256'])
+
+
+def get_image(session:requests.Session, url:str, img_path:str,
+        record:dict=None, force:bool=False) -> (dict, bool):
+    """Download image from url to img_path unless it is unchanged.
+    The image is streamed into a temporary file in the destination directory
+    and renamed over img_path, so an interrupted download never leaves a
+    partial image behind.
+    Parameters
+    ----------
+    session: requests.Session
+        Session used for the request.
     url: str
         URL from which to download the image.
     img_path: str
         File path for saving the image. Only tested with absolute paths.
+    record: dict, optional
+        Manifest record from the previous download, default None.
+    force: bool, optional
+        Download even if the manifest says the file is unchanged,
+        default False.
     Returns
     -------
+    dict:
+        Manifest record for the image, or None if download failed.
+    bool:
+        True if the file on disk was replaced, else False.
     bool:
-        True if download success, else False.
+        True if the server answered Not Modified, else False.
     """
+    headers = dict()
+    current = (not force) and record_is_current(record, img_path)
+    if (current and record.get('url') == url):
+        if (record.get('etag')):
+            headers['If-None-Match'] = record['etag']
+        if (record.get('last_modified')):
+            headers['If-Modified-Since'] = record['last_modified']
     LOG.debug(f'Downloading {img_path} from {url}')
-    # Remove file if it exists
-    if (os.path.isfile(img_path)):
-        LOG.debug(f'Found file at {img_path} - removing')
-        os.remove(img_path)
     try:
-        wget.download(url, img_path, bar=None)
-        return True
+        with session.get(url, headers=headers, stream=True,
+                timeout=30) as response:
+            if (response.status_code == 304):
+                LOG.debug(f'{img_path} is unchanged')
+                # Stamped so the next run trusts the file without hashing
+                return dict(record, mtime_ns=os.stat(img_path).st_mtime_ns), \
+                        False, True
+            response.raise_for_status()
+            img_dir = os.path.dirname(img_path)
+            fd, tmp_path = tempfile.mkstemp(dir=img_dir, suffix='.part')
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                new_record = {
+                    'path': os.path.relpath(img_path, IMAGES_DIR),
+                    'url': url,
+                    'size': size,
+                    'sha256': digest.hexdigest(),
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                # Same bytes as before, keep the old file untouched
+                if (current and new_record['sha256'] == record['sha256']):
+                    os.remove(tmp_path)
+                    new_record['mtime_ns'] = os.stat(img_path).st_mtime_ns
+                    return new_record, False, False
+                os.replace(tmp_path, img_path)
+                new_record['mtime_ns'] = os.stat(img_path).st_mtime_ns
+            except BaseException:
+                if (os.path.exists(tmp_path)):
+                    os.remove(tmp_path)
+                raise
+            return new_record, True, False
     except Exception as e:
         LOG.error(f'Problem downloading {url}: {e}')
-        return False
+        return None, False, False
 
 
 # Duplicate functionality from digicord.py
@@ -71,29 +249,136 @@ def get_field_path(species_number:int, digits:int=3) -> str:
     return os.path.join(FIELD_DIR, f'field-{species_number:0{digits}d}.png')
 
 
+def download_images(database:list, manifest:dict, workers:int=MAX_WORKERS,
+        courtesy_ms:int=COURTESY_MS, force:bool=False) -> dict:
+    """Download sprite and field images for every database entry.
+    Parameters
+    ----------
+    database: list
+        List of dicts containing Digimon info.
+    manifest: dict
+        Manifest from the previous run, updated in place.
+    workers: int, optional
+        Number of concurrent downloads, default MAX_WORKERS.
+    courtesy_ms: int, optional
+        Time in ms each worker waits between requests, default COURTESY_MS.
+    force: bool, optional
+        Download every image even if unchanged, default False.
+    Returns
+    -------
+    dict:
+        Counts of 'downloaded', 'unchanged' and 'failed' images.
+    """
+    session = create_session(workers)
+    records = manifest['species']
+    counts = {'downloaded': 0, 'unchanged': 0, 'failed': 0}
+
+    def work(species_number:int, kind:str, url:str, img_path:str):
+        record = records.get(str(species_number), {}).get(kind)
+        new_record, replaced, not_modified = get_image(session, url,
+                img_path, record, force)
+        # A Not Modified answer costs the server next to nothing
+        if (not not_modified):
+            time.sleep(courtesy_ms / 1000)
+        return species_number, kind, (new_record, replaced)
+
+    progress_man = enlighten.get_manager()
+    progress_bar = progress_man.counter(total=2*len(database),
+            desc='Images', unit='img')
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = list()
+            for digimon in database:
+                species_number = digimon['species_number']
+                futures.append(executor.submit(work, species_number,
+                    'sprite', digimon['sprite_url'],
+                    get_sprite_path(species_number)))
+                futures.append(executor.submit(work, species_number,
+                    'field', digimon['field_url'],
+                    get_field_path(species_number)))
+            for done, future in enumerate(as_completed(futures), 1):
+                species_number, kind, (record, replaced) = future.result()
+                progress_bar.update()
+                if (record is None):
+                    counts['failed'] += 1
+                    continue
+                counts['downloaded' if replaced else 'unchanged'] += 1
+                records.setdefault(str(species_number), {})[kind] = record
+                if (done % MANIFEST_SAVE_EVERY == 0):
+                    save_manifest(manifest)
+    finally:
+        # Whatever finished is recorded, so a rerun resumes from here
+        save_manifest(manifest)
+        progress_man.stop()
+    return counts
+
+
+def build_manifest(database:list, manifest:dict) -> int:
+    """Record the images already on disk in the manifest without downloading.
+    Validators from earlier downloads are kept for files that still match.
+    Parameters
+    ----------
+    database: list
+        List of dicts containing Digimon info.
+    manifest: dict
+        Manifest to update in place.
+    Returns
+    -------
+    int:
+        Number of images recorded.
+    """
+    records = manifest['species']
+    recorded = 0
+    for digimon in database:
+        species_number = digimon['species_number']
+        images = (('sprite', digimon['sprite_url'],
+                    get_sprite_path(species_number)),
+                ('field', digimon['field_url'],
+                    get_field_path(species_number)))
+        for kind, url, img_path in images:
+            if (not os.path.isfile(img_path)):
+                LOG.warning(f'Missing {img_path}')
+                continue
+            old_record = records.get(str(species_number), {}).get(kind)
+            size, sha256 = file_digest(img_path)
+            record = {
+                'path': os.path.relpath(img_path, IMAGES_DIR),
+                'url': url,
+                'size': size,
+                'sha256': sha256,
+                'mtime_ns': os.stat(img_path).st_mtime_ns,
+                'etag': None,
+                'last_modified': None,
+            }
+            if (old_record is not None and old_record['sha256'] == sha256):
+                record['etag'] = old_record.get('etag')
+                record['last_modified'] = old_record.get('last_modified')
+            records.setdefault(str(species_number), {})[kind] = record
+            recorded += 1
+    return recorded
+
+
 if __name__ == '__main__':
     """Download sprite and field images from database entries
     """
+    parser = argparse.ArgumentParser(description='Download Digimon images')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+            help='Number of concurrent downloads')
+    parser.add_argument('--courtesy-ms', type=int, default=COURTESY_MS,
+            help='Time in ms each worker waits between requests')
+    parser.add_argument('--force', action='store_true',
+            help='Download images even if the manifest says unchanged')
+    parser.add_argument('--manifest-only', action='store_true',
+            help='Only record the images already on disk in the manifest')
+    args = parser.parse_args()
     database_path   = os.path.join(FILE_DIR, 'database.json')
     database        = json.load(open(database_path))
-    progress_man    = enlighten.get_manager()
-    progress_bar    = progress_man.counter(total=2*len(database),
-            desc='Images', unit='img')
-    first_download  = True
-    for digimon in database:
-        if (not first_download):
-            time.sleep(COURTESY_MS / 1000)
-        first_download = False
-        # Get file paths for images
-        sprite_path = get_sprite_path(digimon['species_number'])
-        field_path  = get_field_path(digimon['species_number'])
-        # Download sprite image
-        progress_bar.update()
-        get_image(digimon['sprite_url'], sprite_path)
-        time.sleep(COURTESY_MS / 1000)
-        # Download field image
-        progress_bar.update()
-        get_image(digimon['field_url'], field_path)
-    progress_man.stop()
-    LOG.debug('Done downloading images')
-
+    manifest        = load_manifest()
+    if (args.manifest_only):
+        recorded = build_manifest(database, manifest)
+        save_manifest(manifest)
+        LOG.debug(f'Recorded {recorded} images in the manifest')
+        exit(0)
+    counts = download_images(database, manifest, args.workers,
+            args.courtesy_ms, args.force)
+    LOG.debug(f'Done downloading images: {counts}')